@@ -0,0 +1,21 @@
+import sys
+import timeit
+import subprocess
+
+STATEMENTS = {
+	"import pytextdist": "import pytextdist",
+	"import pytextdist.edit_distance": "import pytextdist.edit_distance",
+	"import every submodule": "import pytextdist; [getattr(pytextdist, name) for name in pytextdist._SUBMODULES]",
+}
+
+def time_import(statement, repeat=10):
+	"""
+	Median wall time of a fresh interpreter running the statement, minus that of an empty interpreter
+	"""
+	def run(code):
+		return sorted(timeit.repeat(lambda: subprocess.check_call([sys.executable, "-c", code]), number=1, repeat=repeat))[repeat//2]
+	return run(statement) - run("pass")
+
+if __name__ == "__main__":
+	for name, statement in STATEMENTS.items():
+		print("{:<35s}{:8.1f} ms".format(name, time_import(statement)*1000))
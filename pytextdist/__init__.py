@@ -1,4 +1,3 @@
-
 """
 pytextdist
 
@@ -10,13 +9,25 @@ Contact: yw693@cornell.edu
 __name__ = "pytextdist"
 __version__ = "0.1.6"
 
+import sys
 import importlib
 
-from . import preprocessing 
-importlib.reload(preprocessing)
-from . import input_validator
-importlib.reload(input_validator)
-from . import edit_distance 
-importlib.reload(edit_distance)
-from . import vector_similarity
-importlib.reload(vector_similarity)
+# Submodules are imported on first attribute access, so "import pytextdist" stays cheap
+_SUBMODULES = (
+	"preprocessing", "input_validator", "edit_distance", "vector_similarity", "scoring", "record_linkage",
+	"similarity_join", "cache", "dictionary_search", "sharding",
+)
+
+def __getattr__(name):
+	if name in _SUBMODULES:
+		module = importlib.import_module("." + name, __name__)
+		globals()[name] = module
+		return module
+	raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+def __dir__():
+	return sorted(set(globals()) | set(_SUBMODULES))
+
+# Module __getattr__ needs Python 3.7, older versions import everything up front
+if sys.version_info < (3, 7):
+	for _name in _SUBMODULES: __getattr__(_name)
@@ -0,0 +1,255 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import inspect
+import functools
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+
+from .input_validator import input_validator
+from .preprocessing import phrase_preprocessing
+
+_PREPROCESS_PARAMS = ("ignore_non_alnumspc", "ignore_space", "ignore_numeric", "ignore_case")
+# SQLite limits the number of bound variables per statement, lookups are chunked below it
+_SQL_CHUNK = 500
+
+def _canonical(value):
+	"""
+	JSON-serializable form of a parameter that is equal for equal values and differs for different ones
+	"""
+	if value is None or isinstance(value, (bool, int, float, str)): return value
+	if isinstance(value, (list, tuple)): return [_canonical(item) for item in value]
+	if isinstance(value, dict):
+		items = [[_canonical(k), _canonical(v)] for k, v in value.items()]
+		return ["dict", sorted(items, key=lambda item: json.dumps(item[0], sort_keys=True))]
+	# Arrays are keyed by their full content, their repr elides everything beyond 1000 elements
+	if all(hasattr(value, name) for name in ("dtype", "shape", "tobytes")):
+		if value.shape == (): return _canonical(value.item())
+		return ["ndarray", str(value.dtype), list(value.shape), hashlib.sha256(value.tobytes()).hexdigest()]
+	raise TypeError("Can't build a cache key from parameter of type {}".format(type(value).__name__))
+
+def _parameter_digest(params):
+	"""
+	Stable digest of a dictionary of parameters
+	"""
+	return hashlib.sha256(json.dumps(_canonical(params)).encode("utf-8")).hexdigest()
+
+def cache_key(func, phrase_1, phrase_2, **kwargs):
+	"""
+	Stable key of a metric call, identical across processes and runs
+	|
+	| Phrases are replaced by their preprocessed units so that inputs which only differ in what preprocessing
+	| removes share one entry, and every parameter (including defaults) is part of the key. Parameters may be
+	| numbers, strings, lists, tuples, dictionaries or numpy arrays, anything else raises TypeError
+	|
+	| Argument
+	| | func: function from edit_distance or vector_similarity
+	| | phrase_1, phrase_2: text phrases to compare
+	|
+	| Parameter
+	| | kwargs: parameters passed on to func
+	|
+	| Output
+	| | hex digest (type: str)
+	"""
+	bound = inspect.signature(func).bind(phrase_1, phrase_2, **kwargs)
+	bound.apply_defaults()
+	params = dict(bound.arguments)
+	for name in list(params)[:2]: del params[name]
+	if "grain" in params and all(name in params for name in _PREPROCESS_PARAMS):
+		preprocess_kwargs = {name: params[name] for name in _PREPROCESS_PARAMS}
+		phrase_1 = phrase_preprocessing(phrase_1, grain=params["grain"], **preprocess_kwargs)
+		phrase_2 = phrase_preprocessing(phrase_2, grain=params["grain"], **preprocess_kwargs)
+	return _parameter_digest({"func": "{}.{}".format(func.__module__, func.__name__), "phrases": [phrase_1, phrase_2], "params": params})
+
+class _BaseCache(object):
+	"""
+	Hit and miss counters shared by the caches
+	"""
+	def __init__(self):
+		self.stats = {"hits": 0, "misses": 0}
+
+	def hit_rate(self):
+		n_lookup = self.stats["hits"] + self.stats["misses"]
+		return self.stats["hits"]/n_lookup if n_lookup else 0.0
+
+class MemoryCache(_BaseCache):
+	"""
+	In-process result cache with LRU and TTL eviction
+	|
+	| Parameter
+	| | max_size: maximum number of entries, least recently used entries are evicted first, unbounded if None
+	| | ttl: seconds after which an entry expires, never if None
+	|
+	| Each process has its own entries when used with multiprocessing, use SQLiteCache to share them
+	"""
+	def __init__(self, max_size=None, ttl=None):
+		assert max_size is None or max_size > 0, "Illegal max_size input: {}".format(max_size)
+		super(MemoryCache, self).__init__()
+		self.max_size, self.ttl = max_size, ttl
+		self._entries = OrderedDict()
+
+	def get_many(self, keys):
+		found, now = {}, time.time()
+		for key in keys:
+			entry = self._entries.get(key)
+			if entry is not None and self.ttl is not None and now - entry[1] > self.ttl:
+				del self._entries[key]
+				entry = None
+			if entry is None:
+				self.stats["misses"] += 1
+				continue
+			self._entries.move_to_end(key)
+			found[key] = entry[0]
+			self.stats["hits"] += 1
+		return found
+
+	def set_many(self, items):
+		now = time.time()
+		for key, value in items.items():
+			self._entries[key] = (value, now)
+			self._entries.move_to_end(key)
+		while self.max_size is not None and len(self._entries) > self.max_size: self._entries.popitem(last=False)
+
+	def flush(self):
+		pass
+
+	def __len__(self):
+		return len(self._entries)
+
+class SQLiteCache(_BaseCache):
+	"""
+	Result cache stored in a local SQLite file, shared by processes and runs
+	|
+	| Parameter
+	| | path: SQLite database file, created if missing
+	| | ttl: seconds after which an entry expires, never if None
+	| | batch_size: number of pending writes kept in memory before they are written in one transaction
+	| | timeout: seconds to wait for a lock held by another process
+	|
+	| Each process opens its own connection on first use, so a cache created before forking can be used
+	| by the workers. Call flush (or use the cache as a context manager) to write pending entries.
+	"""
+	def __init__(self, path, ttl=None, batch_size=1000, timeout=30.0):
+		assert batch_size > 0, "Illegal batch_size input: {}".format(batch_size)
+		super(SQLiteCache, self).__init__()
+		self.path, self.ttl, self.batch_size, self.timeout = path, ttl, batch_size, timeout
+		self._pending, self._connection, self._pid = {}, None, None
+
+	def _connect(self):
+		if self._connection is None or self._pid != os.getpid():
+			# A connection inherited through fork must not be used, and its pending writes belong to the parent
+			if self._pid != os.getpid(): self._pending = {}
+			self._connection = sqlite3.connect(self.path, timeout=self.timeout)
+			self._connection.execute("PRAGMA journal_mode=WAL")
+			self._connection.execute("CREATE TABLE IF NOT EXISTS score (key TEXT PRIMARY KEY, value, created REAL)")
+			self._connection.commit()
+			self._pid = os.getpid()
+		return self._connection
+
+	def get_many(self, keys):
+		connection = self._connect()
+		keys = list(keys)
+		found = {key: self._pending[key] for key in keys if key in self._pending}
+		missing = [key for key in keys if key not in found]
+		oldest = -1.0 if self.ttl is None else time.time() - self.ttl
+		for start in range(0, len(missing), _SQL_CHUNK):
+			chunk = missing[start:start+_SQL_CHUNK]
+			rows = connection.execute("SELECT key, value FROM score WHERE created >= ? AND key IN ({})".format(",".join("?" * len(chunk))), [oldest] + chunk)
+			found.update(rows)
+		self.stats["hits"] += len(found)
+		self.stats["misses"] += len(keys) - len(found)
+		return found
+
+	def set_many(self, items):
+		self._connect()
+		self._pending.update(items)
+		if len(self._pending) >= self.batch_size: self.flush()
+
+	def _purge(self, connection, now):
+		# Expired rows are never read again, delete them so that a long-lived file doesn't keep growing
+		if self.ttl is not None: connection.execute("DELETE FROM score WHERE created < ?", (now - self.ttl,))
+
+	def flush(self):
+		if not self._pending: return
+		connection, now = self._connect(), time.time()
+		with connection:
+			connection.executemany("INSERT OR REPLACE INTO score (key, value, created) VALUES (?, ?, ?)", [(key, value, now) for key, value in self._pending.items()])
+			self._purge(connection, now)
+		self._pending = {}
+
+	def close(self):
+		self.flush()
+		if self._connection is not None and self._pid == os.getpid():
+			with self._connection: self._purge(self._connection, time.time())
+			self._connection.close()
+		self._connection, self._pid = None, None
+
+	def __len__(self):
+		self.flush()
+		return self._connect().execute("SELECT COUNT(*) FROM score").fetchone()[0]
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state.update({"_pending": {}, "_connection": None, "_pid": None})
+		return state
+
+def cached(func, cache):
+	"""
+	Wrap a metric function so that results are looked up in and written to a cache
+	|
+	| Argument
+	| | func: function from edit_distance or vector_similarity
+	| | cache: MemoryCache or SQLiteCache
+	|
+	| Output
+	| | function with the same signature as func (type: function)
+	"""
+	@functools.wraps(func)
+	def wrapper(phrase_1, phrase_2, **kwargs):
+		key = cache_key(func, phrase_1, phrase_2, **kwargs)
+		found = cache.get_many([key])
+		if key in found: return found[key]
+		value = func(phrase_1, phrase_2, **kwargs)
+		cache.set_many({key: value})
+		return value
+	return wrapper
+
+@input_validator(object, list, object)
+def cached_batch(func, pairs, cache, **kwargs):
+	"""
+	Score each pair of text phrases, with one cache lookup and one cache write for the whole batch
+	|
+	| Argument
+	| | func: function from edit_distance or vector_similarity
+	| | pairs: list of (phrase_1, phrase_2) tuples to compare
+	| | cache: MemoryCache or SQLiteCache
+	|
+	| Parameter
+	| | kwargs: parameters passed on to func
+	|
+	| Output
+	| | list of scores (type: list)
+	"""
+	keys = [cache_key(func, phrase_1, phrase_2, **kwargs) for phrase_1, phrase_2 in pairs]
+	found = cache.get_many(set(keys))
+	computed = {}
+	for key, (phrase_1, phrase_2) in zip(keys, pairs):
+		if key not in found and key not in computed: computed[key] = func(phrase_1, phrase_2, **kwargs)
+	if computed: cache.set_many(computed)
+	cache.flush()
+	return [found[key] if key in found else computed[key] for key in keys]
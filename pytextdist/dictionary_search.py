@@ -0,0 +1,167 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import heapq
+import logging
+logger = logging.getLogger(__name__)
+
+from .input_validator import input_validator
+from .preprocessing import phrase_preprocessing
+from .scoring import _edit_scores
+
+class _TrieNode(object):
+	__slots__ = ("children", "entries", "min_len", "max_len")
+
+	def __init__(self):
+		self.children, self.entries = {}, []
+		self.min_len, self.max_len = float("inf"), 0
+
+class TrieMatcher(object):
+	"""
+	Vocabulary stored in a trie of edit units, searched by walking the trie once per query
+	|
+	| Argument
+	| | vocabulary: list of text phrases
+	|
+	| Parameter
+	| | grain: "char" or "word", grain for edit
+	|
+	| Parameter for preprocessing
+	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
+	| | ignore_space: whether to remove all spaces if grain is character
+	| | ignore_numeric: whether to remove all numeric characters
+	| | ignore_case: whether to convert all alpha characters to lower case
+	"""
+	@input_validator(object, list)
+	def __init__(self, vocabulary, grain="char", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+		self.preprocess_kwargs = dict(grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_space=ignore_space, ignore_numeric=ignore_numeric, ignore_case=ignore_case)
+		self.root, self.size = _TrieNode(), 0
+		for entry in vocabulary: self.add(entry)
+
+	@input_validator(object, str)
+	def add(self, entry):
+		"""
+		Add a text phrase to the vocabulary, phrases with the same preprocessed units share a node
+		"""
+		units = phrase_preprocessing(entry, **self.preprocess_kwargs)
+		node = self.root
+		for unit in units:
+			node.min_len, node.max_len = min(node.min_len, len(units)), max(node.max_len, len(units))
+			node = node.children.setdefault(unit, _TrieNode())
+		node.min_len, node.max_len = min(node.min_len, len(units)), max(node.max_len, len(units))
+		node.entries.append((self.size, entry))
+		self.size += 1
+
+	def __len__(self):
+		return self.size
+
+	@input_validator(object, str, max_distance=(int, type(None)))
+	def search(self, query, max_distance=2, metric="levenshtein_distance"):
+		"""
+		Find vocabulary phrases within an edit distance of a query
+		|
+		| Each trie node extends the dynamic programming row of its parent by one unit, so a row is computed once for
+		| all phrases sharing the prefix, and a subtree is skipped once every entry of its row exceeds max_distance
+		|
+		| Argument
+		| | query: text phrase to look up
+		|
+		| Parameter
+		| | max_distance: largest distance of a returned phrase, every phrase is returned if None
+		| | metric: "levenshtein_distance" or "damerau_levenshtein_distance"
+		|
+		| Output
+		| | list of (phrase, distance) sorted by distance, then by insertion order (type: list[tuple])
+		"""
+		assert metric in ("levenshtein_distance", "damerau_levenshtein_distance"), "Illegal metric input: {}".format(metric)
+		units = phrase_preprocessing(query, **self.preprocess_kwargs)
+		len_q, transpose = len(units), metric == "damerau_levenshtein_distance"
+		limit = float("inf") if max_distance is None else max_distance
+
+		matches = []
+		root_row = list(range(len_q+1))
+		stack = [(self.root, root_row, None, None)]
+		while stack:
+			node, row, prev_row, prev_unit = stack.pop()
+			if node.entries and row[-1] <= limit:
+				matches.extend([(row[-1], index, entry) for index, entry in node.entries])
+			for unit, child in node.children.items():
+				child_row = [row[0]+1]
+				for j in range(1, len_q+1):
+					value = min(row[j-1] + (0 if units[j-1] == unit else 1), row[j]+1, child_row[j-1]+1)
+					# Transposition of adjacent units, same restricted form as edit_distance.damerau_levenshtein_distance
+					if transpose and prev_row is not None and j >= 2 and prev_unit == units[j-1] and unit == units[j-2]:
+						value = min(value, prev_row[j-2]+1)
+					child_row.append(value)
+				# Transposition may reach back two rows, so the parent row also bounds what the subtree can reach
+				if min(child_row) <= limit or (transpose and min(row)+1 <= limit):
+					stack.append((child, child_row, row, unit))
+		return [(entry, distance) for distance, _, entry in sorted(matches)]
+
+	@input_validator(object, str, top_k=int, p=float, min_similarity=(int, float), stats=(dict, type(None)))
+	def rank_jaro_winkler(self, query, top_k=10, p=0.1, min_similarity=0.0, stats=None):
+		"""
+		Find the vocabulary phrases most similar to a query under Jaro-Winkler similarity
+		|
+		| Trie nodes are visited by decreasing upper bound of the similarity of the phrases below them, and the walk
+		| stops once no remaining node can enter the top k. The bound tightens with depth: units of the path beyond
+		| their count in the query can never match, and the Winkler bonus is fixed once the path leaves the query prefix
+		|
+		| Argument
+		| | query: text phrase to look up
+		|
+		| Parameter
+		| | top_k: number of phrases to return
+		| | p: constant scaling factor, should not exceed 0.25
+		| | min_similarity: smallest similarity of a returned phrase
+		| | stats: dictionary filled with the number of visited nodes and of scored phrases
+		|
+		| Output
+		| | list of (phrase, similarity) sorted by decreasing similarity, then by insertion order (type: list[tuple])
+		"""
+		assert 0 < p < 0.25, "Illegal p input: {}".format(p)
+		assert top_k > 0, "Illegal top_k input: {}".format(top_k)
+		units = phrase_preprocessing(query, **self.preprocess_kwargs)
+		len_q = len(units)
+		query_count = {}
+		for unit in units: query_count[unit] = query_count.get(unit, 0) + 1
+
+		def bound(node, depth, prefix, unmatched):
+			# Matches are capped by the query length and by the phrase units that can still match, the best phrase
+			# length is the one where both caps meet, and the Winkler bonus can't exceed the prefix still reachable
+			if len_q == 0 or node.max_len == 0: return 1.0
+			len_w = min(max(len_q + unmatched, node.min_len), node.max_len)
+			n_match = min(len_q, len_w - unmatched)
+			if n_match <= 0: return 0.0
+			jaro = (n_match/len_q + n_match/len_w + 1)/3
+			prefix = min(5, len_q, node.max_len) if prefix == depth else min(5, prefix)
+			# Similarity is prefix*p + jaro*(1-prefix*p), which falls with Jaro once prefix*p exceeds 1
+			return max(prefix*p, jaro + prefix*p*(1-jaro))
+
+		best, n_visited, n_scored, order = [], 0, 0, 0
+		frontier = [(-bound(self.root, 0, 0, 0), order, self.root, [], 0, 0)]
+		while frontier:
+			negative_bound, _, node, path, prefix, unmatched = heapq.heappop(frontier)
+			threshold = max(min_similarity, best[0][0]) if len(best) == top_k else min_similarity
+			# Bounds of the remaining nodes are no higher, so none of them can enter the top k
+			if -negative_bound < threshold: break
+			n_visited += 1
+			if node.entries:
+				similarity = _edit_scores(units, path, ["jaro_winkler_similarity"], p)["jaro_winkler_similarity"]
+				n_scored += len(node.entries)
+				for index, entry in node.entries:
+					if similarity < threshold: break
+					heapq.heappush(best, (similarity, -index, entry))
+					if len(best) > top_k: heapq.heappop(best)
+					threshold = max(min_similarity, best[0][0]) if len(best) == top_k else min_similarity
+			depth = len(path)
+			for unit, child in node.children.items():
+				child_prefix = prefix + 1 if prefix == depth and depth < len_q and unit == units[depth] else prefix
+				child_unmatched = unmatched + (1 if path.count(unit) >= query_count.get(unit, 0) else 0)
+				child_bound = bound(child, depth+1, child_prefix, child_unmatched)
+				if child_bound >= threshold:
+					order += 1
+					heapq.heappush(frontier, (-child_bound, order, child, path + [unit], child_prefix, child_unmatched))
+		if stats is not None: stats.update({"n_visited": n_visited, "n_scored": n_scored})
+		return [(entry, similarity) for similarity, _, entry in sorted(best, key=lambda item: (-item[0], -item[1]))]
@@ -2,11 +2,12 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import bisect
 import logging
 logger = logging.getLogger(__name__)
 
 from .input_validator import input_validator
-from .preprocessing import phrase_preprocessing
+from .preprocessing import phrase_preprocessing, ngram_counter
 
 @input_validator(str, str)
 def levenshtein_distance(phrase_1, phrase_2, grain="char", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
@@ -484,3 +485,354 @@ def hamming_similarity(phrase_1, phrase_2, grain="char", ignore_non_alnumspc=Tru
 	similarity = 1 - distance/len_1
 
 	return similarity
+
+def _alignment_row(l_1, l_2, lo_1, hi_1, lo_2, hi_2, sub_cost, reverse=False):
+	"""
+	Last row of edit cost between l_1[lo_1:hi_1] and prefixes (or suffixes if reverse) of l_2[lo_2:hi_2]
+	"""
+	len_2 = hi_2 - lo_2
+	row = list(range(len_2+1))
+	units_2 = [l_2[hi_2-1-k] for k in range(len_2)] if reverse else l_2[lo_2:hi_2]
+	for i in (range(hi_1-1, lo_1-1, -1) if reverse else range(lo_1, hi_1)):
+		unit_1 = l_1[i]
+		prev, row = row, [row[0]+1]
+		for k in range(len_2):
+			row.append(min(prev[k] + (0 if unit_1 == units_2[k] else sub_cost), prev[k+1]+1, row[k]+1))
+	return row
+
+def _hirschberg(l_1, l_2, lo_1, hi_1, lo_2, hi_2, sub_cost, script):
+	"""
+	Append edit operations aligning l_1[lo_1:hi_1] with l_2[lo_2:hi_2] to script using linear memory
+	"""
+	if hi_1 == lo_1:
+		script.extend([("insert", lo_1, j) for j in range(lo_2, hi_2)])
+	elif hi_2 == lo_2:
+		script.extend([("delete", i, lo_2) for i in range(lo_1, hi_1)])
+	elif hi_1 - lo_1 == 1:
+		# Single unit: keep it at its first match, otherwise substitute (or delete if substitution is not allowed)
+		match = next((j for j in range(lo_2, hi_2) if l_2[j] == l_1[lo_1]), None)
+		if match is not None:
+			script.extend([("insert", lo_1, j) for j in range(lo_2, match)])
+			script.extend([("insert", hi_1, j) for j in range(match+1, hi_2)])
+		elif sub_cost == 1:
+			script.append(("replace", lo_1, lo_2))
+			script.extend([("insert", hi_1, j) for j in range(lo_2+1, hi_2)])
+		else:
+			script.append(("delete", lo_1, lo_2))
+			script.extend([("insert", hi_1, j) for j in range(lo_2, hi_2)])
+	else:
+		mid = (lo_1 + hi_1) // 2
+		forward = _alignment_row(l_1, l_2, lo_1, mid, lo_2, hi_2, sub_cost)
+		backward = _alignment_row(l_1, l_2, mid, hi_1, lo_2, hi_2, sub_cost, reverse=True)
+		len_2 = hi_2 - lo_2
+		split = min(range(len_2+1), key=lambda k: forward[k] + backward[len_2-k])
+		_hirschberg(l_1, l_2, lo_1, mid, lo_2, lo_2+split, sub_cost, script)
+		_hirschberg(l_1, l_2, mid, hi_1, lo_2+split, hi_2, sub_cost, script)
+
+def _edit_script(l_1, l_2, sub_cost):
+	"""
+	Edit script between two lists of edit units, common prefix and suffix are skipped before divide-and-conquer
+	"""
+	len_1, len_2 = len(l_1), len(l_2)
+	prefix = 0
+	while prefix < len_1 and prefix < len_2 and l_1[prefix] == l_2[prefix]: prefix += 1
+	suffix = 0
+	while suffix < len_1 - prefix and suffix < len_2 - prefix and l_1[len_1-1-suffix] == l_2[len_2-1-suffix]: suffix += 1
+	script = []
+	_hirschberg(l_1, l_2, prefix, len_1-suffix, prefix, len_2-suffix, sub_cost, script)
+	return script
+
+@input_validator(str, str)
+def levenshtein_alignment(phrase_1, phrase_2, grain="char", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+	"""
+	Get Levenshtein edit script turning one text phrase into the other, using Hirschberg's linear-memory algorithm
+	|
+	| Argument
+	| | phrase_1, phrase_2: text phrases to compare
+	|
+	| Parameter
+	| | grain: "char" or "word", grain for edit
+	|
+	| Parameter for preprocessing
+	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
+	| | ignore_space: whether to remove all spaces if grain is character
+	| | ignore_numeric: whether to remove all numeric characters
+	| | ignore_case: whether to convert all alpha characters to lower case
+	|
+	| Output
+	| | list of (operation, index_1, index_2) with operation "insert", "delete" or "replace" (type: list[tuple])
+	| | indices refer to the preprocessed units of phrase_1 and phrase_2, unchanged units are not listed,
+	| | so the length of the script equals the Levenshtein distance
+	"""
+	l_1 = phrase_preprocessing(phrase_1, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
+	l_2 = phrase_preprocessing(phrase_2, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
+	return _edit_script(l_1, l_2, 1)
+
+@input_validator(str, str)
+def lcs_alignment(phrase_1, phrase_2, grain="char", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+	"""
+	Get longest common subsequence edit script turning one text phrase into the other, using Hirschberg's linear-memory algorithm
+	|
+	| Argument
+	| | phrase_1, phrase_2: text phrases to compare
+	|
+	| Parameter
+	| | grain: "char" or "word", grain for edit
+	|
+	| Parameter for preprocessing
+	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
+	| | ignore_space: whether to remove all spaces if grain is character
+	| | ignore_numeric: whether to remove all numeric characters
+	| | ignore_case: whether to convert all alpha characters to lower case
+	|
+	| Output
+	| | list of (operation, index_1, index_2) with operation "insert" or "delete" (type: list[tuple])
+	| | indices refer to the preprocessed units of phrase_1 and phrase_2, unchanged units are not listed,
+	| | so the length of the script equals the longest common subsequence distance
+	"""
+	l_1 = phrase_preprocessing(phrase_1, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
+	l_2 = phrase_preprocessing(phrase_2, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
+	# Substitution at cost 2 is never cheaper than a deletion plus an insertion
+	return _edit_script(l_1, l_2, 2)
+
+def _unique_kmer_anchors(l_1, l_2, lo_1, hi_1, lo_2, hi_2, k):
+	"""
+	Non-overlapping (start_1, start_2, length) matches in increasing order, seeded by k-mers occurring once in each range
+	"""
+	def unique_kmers(l, lo, hi):
+		position = {}
+		for i in range(lo, hi-k+1):
+			kmer = tuple(l[i:i+k])
+			position[kmer] = -1 if kmer in position else i
+		return position
+	kmers_1, kmers_2 = unique_kmers(l_1, lo_1, hi_1), unique_kmers(l_2, lo_2, hi_2)
+	seeds = sorted((i, kmers_2[kmer]) for kmer, i in kmers_1.items() if i >= 0 and kmers_2.get(kmer, -1) >= 0)
+
+	# Longest chain of seeds increasing in both phrases, seeds out of order are most likely spurious
+	tails, tail_ids, parent = [], [], [None] * len(seeds)
+	for seed_id, (_, j) in enumerate(seeds):
+		rank = bisect.bisect_left(tails, j)
+		if rank > 0: parent[seed_id] = tail_ids[rank-1]
+		if rank == len(tails):
+			tails.append(j)
+			tail_ids.append(seed_id)
+		else:
+			tails[rank], tail_ids[rank] = j, seed_id
+	chain, seed_id = [], tail_ids[-1] if tail_ids else None
+	while seed_id is not None:
+		chain.append(seeds[seed_id])
+		seed_id = parent[seed_id]
+
+	# Merge overlapping seeds and extend each match as far as the units agree
+	anchors, end_1, end_2 = [], lo_1, lo_2
+	for i, j in reversed(chain):
+		if i < end_1 or j < end_2: continue
+		length = k
+		while i+length < hi_1 and j+length < hi_2 and l_1[i+length] == l_2[j+length]: length += 1
+		anchors.append((i, j, length))
+		end_1, end_2 = i+length, j+length
+	return anchors
+
+def _anchored_distance(l_1, l_2, k):
+	"""
+	Levenshtein cost of the best alignment that keeps every anchor matched, gaps are anchored again with k-mers unique within them
+	"""
+	distance, gaps = 0, [(0, len(l_1), 0, len(l_2))]
+	while gaps:
+		lo_1, hi_1, lo_2, hi_2 = gaps.pop()
+		anchors = _unique_kmer_anchors(l_1, l_2, lo_1, hi_1, lo_2, hi_2, k) if min(hi_1-lo_1, hi_2-lo_2) >= 2*k else []
+		if not anchors:
+			distance += _alignment_row(l_1, l_2, lo_1, hi_1, lo_2, hi_2, 1)[-1]
+			continue
+		end_1, end_2 = lo_1, lo_2
+		for i, j, length in anchors:
+			gaps.append((end_1, i, end_2, j))
+			end_1, end_2 = i+length, j+length
+		gaps.append((end_1, hi_1, end_2, hi_2))
+	return distance
+
+def _qgram_lower_bound(l_1, l_2, k):
+	"""
+	Lower bound of the Levenshtein distance from the q-gram lemma, one edit destroys at most k shared k-grams
+	"""
+	len_1, len_2 = len(l_1), len(l_2)
+	if min(len_1, len_2) < k: return abs(len_1 - len_2)
+	shared = sum((ngram_counter(l_1, n=k, key="tuple") & ngram_counter(l_2, n=k, key="tuple")).values())
+	return max(abs(len_1 - len_2), -(-(max(len_1, len_2) - k + 1 - shared) // k))
+
+@input_validator(str, str, k=int)
+def approximate_levenshtein_distance(phrase_1, phrase_2, k=12, grain="char", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+	"""
+	Get an approximate Levenshtein distance between two long text phrases, computing the exact distance only between anchors
+	|
+	| Runs of k units occurring exactly once in each phrase are chained in order and extended into anchors, which are
+	| kept as matches, and the exact linear-memory recurrence is run on the gaps between them. Gaps are anchored again
+	| with runs unique within the gap. Time is close to linear when most of the text is shared.
+	|
+	| Argument
+	| | phrase_1, phrase_2: text phrases to compare
+	|
+	| Parameter
+	| | k: number of units in an anchor seed, shorter seeds find more anchors but more of them may be spurious
+	| | grain: "char" or "word", grain for edit
+	|
+	| Parameter for preprocessing
+	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
+	| | ignore_space: whether to remove all spaces if grain is character
+	| | ignore_numeric: whether to remove all numeric characters
+	| | ignore_case: whether to convert all alpha characters to lower case
+	|
+	| Output
+	| | (distance, lower_bound) (type: tuple[int])
+	| | distance is the cost of a valid edit script, so it is an upper bound of the exact Levenshtein distance and
+	| | equals it whenever the anchors lie on an optimal alignment, lower_bound never exceeds the exact distance:
+	| | it is the larger of the length difference and ceil((longest length - k + 1 - shared k-grams) / k)
+	"""
+	assert k > 0, "Illegal k input: {}".format(k)
+	l_1 = phrase_preprocessing(phrase_1, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
+	l_2 = phrase_preprocessing(phrase_2, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
+	return _anchored_distance(l_1, l_2, k), _qgram_lower_bound(l_1, l_2, k)
+
+def _weighted_costs(np, units, substitute_costs, insert_costs, delete_costs, alphabet, default_cost):
+	"""
+	Encode edit units over the alphabet and build dense substitution, insertion and deletion cost arrays
+	"""
+	symbols = list(alphabet) if alphabet is not None else []
+	code = {symbol: index for index, symbol in enumerate(symbols)}
+	for unit in units: code.setdefault(unit, len(code))
+	n_symbol = len(code)
+
+	substitute = np.full((n_symbol, n_symbol), float(default_cost))
+	insert, delete = np.full(n_symbol, float(default_cost)), np.full(n_symbol, float(default_cost))
+	for costs, target in ((substitute_costs, substitute), (insert_costs, insert), (delete_costs, delete)):
+		if costs is None: continue
+		if isinstance(costs, dict):
+			for key, cost in costs.items():
+				# Units that appear in neither phrase nor alphabet can't be edited, so their costs are not needed
+				index = tuple(code.get(unit) for unit in key) if target.ndim == 2 else (code.get(key),)
+				if None not in index: target[index] = cost
+		elif np.isscalar(costs):
+			target[...] = costs
+		else:
+			costs = np.asarray(costs, dtype=float)
+			assert alphabet is not None and costs.shape == (len(symbols),) * target.ndim, "Illegal cost input: expect a {}-d array over the alphabet".format(target.ndim)
+			target[tuple(slice(0, len(symbols)) for _ in range(target.ndim))] = costs
+	# Matching units are never edited
+	np.fill_diagonal(substitute, 0)
+	return code, substitute, insert, delete
+
+def _length_buckets(lengths, min_length=8):
+	"""
+	Indices grouped by length so that no length exceeds twice the shortest of its group (or min_length)
+	|
+	| Every target of a _weighted_dp call is padded to the longest one, grouping keeps a single long choice from
+	| multiplying the work of all short ones, while the number of groups only grows with the log of the length range
+	"""
+	buckets, bucket_limit = [], -1
+	for index in sorted(range(len(lengths)), key=lambda index: lengths[index]):
+		if lengths[index] > bucket_limit:
+			buckets.append([])
+			bucket_limit = 2 * max(lengths[index], min_length)
+		buckets[-1].append(index)
+	return buckets
+
+def _weighted_dp(np, encoded_1, encoded_2s, substitute, insert, delete):
+	"""
+	Weighted Levenshtein distances from one encoded sequence to many, filling the matrices one anti-diagonal at a time
+	|
+	| Cells on an anti-diagonal only depend on the two previous ones, so each anti-diagonal is one vectorized
+	| update for every cell and every target at once. Targets are padded to the longest one and each distance
+	| is read when the wavefront reaches its last column.
+	"""
+	len_1, n_target = len(encoded_1), len(encoded_2s)
+	lengths = np.array([len(encoded_2) for encoded_2 in encoded_2s], dtype=int)
+	len_2 = int(lengths.max()) if n_target else 0
+	codes_1 = np.array(encoded_1, dtype=int)
+	codes_2 = np.zeros((n_target, len_2), dtype=int)
+	for target, encoded_2 in enumerate(encoded_2s): codes_2[target, :len(encoded_2)] = encoded_2
+	# Along a diagonal the row goes up while the column goes down, reversed targets make both plain slices
+	reversed_2 = codes_2[:, ::-1]
+	delete_1, insert_2 = delete[codes_1], insert[reversed_2]
+
+	first_column = np.concatenate([[0], np.cumsum(delete_1)])
+	first_row = np.concatenate([np.zeros((n_target, 1)), np.cumsum(insert[codes_2], axis=1)], axis=1)
+	distances = np.zeros(n_target)
+	distances[lengths == 0] = first_column[-1]
+	# Diagonals are indexed by row i, cell (i, d-i). Buffers are reused and only the live band of cells is written,
+	# the recurrence never reads outside the band of the two previous diagonals, so stale cells are harmless
+	prev_2, prev, cur = (np.zeros((n_target, len_1+1)) for _ in range(3))
+	for diagonal in range(1, len_1+len_2+1):
+		if diagonal <= len_2: cur[:, 0] = first_row[:, diagonal]
+		if diagonal <= len_1: cur[:, diagonal] = first_column[diagonal]
+		lo, hi = max(1, diagonal-len_2), min(len_1, diagonal-1)
+		if lo <= hi:
+			offset = len_2 - diagonal
+			unit_1, unit_2 = codes_1[lo-1:hi], reversed_2[:, offset+lo:offset+hi+1]
+			cur[:, lo:hi+1] = np.minimum(np.minimum(
+				prev_2[:, lo-1:hi] + substitute[unit_1, unit_2],
+				prev[:, lo-1:hi] + delete_1[lo-1:hi]),
+				prev[:, lo:hi+1] + insert_2[:, offset+lo:offset+hi+1])
+		done = lengths == diagonal - len_1
+		if diagonal >= len_1 and done.any(): distances[done] = cur[done, len_1]
+		prev_2, prev, cur = prev, cur, prev_2
+	return distances
+
+@input_validator(str, str, default_cost=(int, float))
+def weighted_levenshtein_distance(phrase_1, phrase_2, substitute_costs=None, insert_costs=None, delete_costs=None, alphabet=None, default_cost=1, grain="char", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+	"""
+	Get Levenshtein distance between two text phrases with a cost for each operation and pair of units, requires numpy
+	|
+	| Computed with an anti-diagonal wavefront vectorized in numpy, memory stays linear in the input lengths
+	|
+	| Argument
+	| | phrase_1, phrase_2: text phrases to compare
+	|
+	| Parameter
+	| | substitute_costs: cost of replacing a unit of phrase_1 by a unit of phrase_2, a dictionary of
+	| |   {(unit_1, unit_2): cost} or a square array over the alphabet, matching units always cost 0
+	| | insert_costs: cost of inserting a unit of phrase_2, a dictionary of {unit: cost}, an array over the alphabet or a number
+	| | delete_costs: cost of deleting a unit of phrase_1, a dictionary of {unit: cost}, an array over the alphabet or a number
+	| | alphabet: list of units giving the positions of units in cost arrays
+	| | default_cost: cost of an operation that no cost table covers
+	| | grain: "char" or "word", grain for edit
+	|
+	| Parameter for preprocessing
+	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
+	| | ignore_space: whether to remove all spaces if grain is character
+	| | ignore_numeric: whether to remove all numeric characters
+	| | ignore_case: whether to convert all alpha characters to lower case
+	|
+	| Output
+	| | distance (type: float)
+	"""
+	return weighted_levenshtein_distance_batch(phrase_1, [phrase_2], substitute_costs=substitute_costs, insert_costs=insert_costs, delete_costs=delete_costs, alphabet=alphabet, default_cost=default_cost, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_space=ignore_space, ignore_numeric=ignore_numeric, ignore_case=ignore_case)[0]
+
+@input_validator(str, list, default_cost=(int, float))
+def weighted_levenshtein_distance_batch(phrase, choices, substitute_costs=None, insert_costs=None, delete_costs=None, alphabet=None, default_cost=1, grain="char", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+	"""
+	Get weighted Levenshtein distance from one text phrase to each of many, in a single vectorized pass, requires numpy
+	|
+	| Argument
+	| | phrase: text phrase to compare, edits turn it into each choice
+	| | choices: list of text phrases to compare with
+	|
+	| Parameter
+	| | see weighted_levenshtein_distance
+	|
+	| Output
+	| | list of distances (type: list[float])
+	"""
+	try:
+		import numpy as np
+	except ImportError:
+		raise ImportError("weighted_levenshtein_distance requires numpy, install it with: pip install numpy")
+	l_1 = phrase_preprocessing(phrase, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
+	l_2s = [phrase_preprocessing(choice, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space) for choice in choices]
+	if not choices: return []
+	code, substitute, insert, delete = _weighted_costs(np, l_1 + [unit for l_2 in l_2s for unit in l_2], substitute_costs, insert_costs, delete_costs, alphabet, default_cost)
+	encoded_1 = [code[unit] for unit in l_1]
+	distances = [0.0] * len(choices)
+	for bucket in _length_buckets([len(l_2) for l_2 in l_2s]):
+		bucket_distances = _weighted_dp(np, encoded_1, [[code[unit] for unit in l_2s[index]] for index in bucket], substitute, insert, delete)
+		for index, distance in zip(bucket, bucket_distances.tolist()): distances[index] = distance
+	return distances
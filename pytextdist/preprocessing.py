@@ -6,6 +6,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 from collections import Counter
+from itertools import islice
 
 from .input_validator import input_validator
 
@@ -82,8 +83,8 @@ def phrase_preprocessing(phrase, grain="char", ignore_non_alnumspc=True, ignore_
 	else:
 		return sentence_preprocessing(phrase, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case)
 
-@input_validator(list, n=int)
-def ngram_counter(list_of_token, n=2):
+@input_validator(list, n=int, key=str, registry=(dict, type(None)))
+def ngram_counter(list_of_token, n=2, key="str", registry=None):
 	"""
 	Function for converting a list of ordered tokens into n-grams.
 	| Argument
@@ -91,12 +92,34 @@ def ngram_counter(list_of_token, n=2):
 	| 
 	| Parameter
 	| | n: number of continuous tokens to group
+	| | key: "str", "tuple" or "hash", representation of each n-gram
+	| |   - "str": tokens joined by a single space
+	| |   - "tuple": tuple of tokens, no string is built for each position, the fastest exact representation
+	| |   - "hash": integer hash of the tuple of tokens, compact but may collide. Python salts hash() per process
+	| |     (see PYTHONHASHSEED), so hash keys can only be compared within the process that built them
+	| | registry: dictionary shared between calls for collision-checked "hash" keys,
+	| |   an n-gram whose hash is already taken by a different n-gram is keyed by its tuple.
+	| |   The registry holds every tuple and checking is slower than "str", so use "tuple" when exact keys are needed
 	|
 	| Output
 	| | dictionary of count of ngrams (type: collections.Counter)
 	"""
+	assert key in ("str", "tuple", "hash"), "Illegal key input: {}".format(key)
 	if len(list_of_token) < n: raise Exception("Can't get {}-gram from input of length {}".format(n, len(list_of_token)))
-	ngram_cnt = Counter([' '.join(list_of_token[index:index+n]) for index in range(len(list_of_token)-n+1)])
+	if key == "str":
+		ngram_cnt = Counter([' '.join(list_of_token[index:index+n]) for index in range(len(list_of_token)-n+1)])
+		return ngram_cnt
+
+	# Zip shifted views of the token list so that no slice is copied per position
+	ngram_iter = zip(*[islice(list_of_token, offset, None) for offset in range(n)])
+	if key == "tuple": return Counter(ngram_iter)
+	if registry is None: return Counter(map(hash, ngram_iter))
+
+	# Collision-checked hash: first n-gram seen for a hash owns it, later different n-grams fall back to tuple
+	ngram_cnt = Counter()
+	for ngram, cnt in Counter(ngram_iter).items():
+		hash_value = hash(ngram)
+		ngram_cnt[hash_value if registry.setdefault(hash_value, ngram) == ngram else ngram] += cnt
 	return ngram_cnt
 
 
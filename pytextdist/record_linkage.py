@@ -0,0 +1,215 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import defaultdict
+
+from .input_validator import input_validator
+from .preprocessing import phrase_preprocessing, ngram_counter
+
+def prefix_blocking_key(phrase, length=4, ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+	"""
+	Blocking key made of the first characters of the normalized phrase
+	|
+	| Argument
+	| | phrase: a string to be processed
+	|
+	| Parameter
+	| | length: number of leading characters to keep
+	|
+	| Parameter for preprocessing
+	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
+	| | ignore_space: whether to remove all spaces
+	| | ignore_numeric: whether to remove all numeric characters
+	| | ignore_case: whether to convert all alpha characters to lower case
+	|
+	| Output
+	| | list of keys, empty if nothing is left after preprocessing (type: list[str])
+	"""
+	l_char = phrase_preprocessing(phrase, grain="char", ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
+	return ["".join(l_char[:length])] if l_char else []
+
+def sorted_token_blocking_key(phrase, ignore_non_alnumspc=True, ignore_numeric=True, ignore_case=True):
+	"""
+	Blocking key made of the words of the normalized phrase in sorted order, robust to word reordering
+	|
+	| Argument
+	| | phrase: a string to be processed
+	|
+	| Parameter for preprocessing
+	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
+	| | ignore_numeric: whether to remove all numeric characters
+	| | ignore_case: whether to convert all alpha characters to lower case
+	|
+	| Output
+	| | list of keys, empty if nothing is left after preprocessing (type: list[str])
+	"""
+	l_word = phrase_preprocessing(phrase, grain="word", ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case)
+	return [" ".join(sorted(l_word))] if l_word else []
+
+def ngram_blocking_key(phrase, n=3, grain="char", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+	"""
+	Blocking keys made of every distinct n-gram of the normalized phrase
+	|
+	| Argument
+	| | phrase: a string to be processed
+	|
+	| Parameter
+	| | n: number of continuous tokens to group
+	| | grain: "char" or "word", grain for building n-grams
+	|
+	| Parameter for preprocessing
+	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
+	| | ignore_space: whether to remove all spaces if grain is character
+	| | ignore_numeric: whether to remove all numeric characters
+	| | ignore_case: whether to convert all alpha characters to lower case
+	|
+	| Output
+	| | list of keys, empty if the phrase is shorter than n units (type: list[str])
+	"""
+	l_token = phrase_preprocessing(phrase, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
+	return list(ngram_counter(l_token, n=n).keys()) if len(l_token) >= n else []
+
+def _record_keys(records, key_funcs):
+	"""
+	Keys of every record, tagged with the position of the key function so that different functions never share a block
+	"""
+	return [{(index, key) for index, key_func in enumerate(key_funcs) for key in key_func(record)} for record in records]
+
+def _init_stats(stats, n_pair):
+	if stats is None: return {}
+	stats.update({"n_pair": n_pair, "n_candidate": 0, "reduction_ratio": 1.0})
+	return stats
+
+def _update_reduction_ratio(stats):
+	if stats: stats["reduction_ratio"] = 1 - stats["n_candidate"]/stats["n_pair"] if stats["n_pair"] else 1.0
+
+@input_validator(list, records_2=(list, type(None)), key_funcs=(list, tuple), max_block_size=(int, type(None)), stats=(dict, type(None)))
+def block_candidate_pairs(records, records_2=None, key_funcs=(prefix_blocking_key,), max_block_size=None, stats=None):
+	"""
+	Stream candidate pairs of records sharing at least one blocking key
+	|
+	| Each pair is emitted once, under the lowest key (in sorted order) shared by both records, so no set of emitted
+	| pairs is kept. The price is one intersection of the two key sets for every block a pair shares, which adds up
+	| with many keys per record, e.g. n-gram keys
+	|
+	| Argument
+	| | records: list of text phrases
+	|
+	| Parameter
+	| | records_2: list of text phrases to link against records, pairs within records are generated if not given
+	| | key_funcs: functions mapping a phrase to a list of blocking keys, use functools.partial to set their parameters
+	| | max_block_size: blocks with more records than this (typically very common keys) are skipped
+	| | stats: dictionary filled with pair, block and candidate counts and the reduction ratio while streaming
+	|
+	| Output
+	| | generator of (index_1, index_2), index_2 refers to records_2 if given and index_1 < index_2 otherwise (type: generator[tuple])
+	"""
+	keys_1 = _record_keys(records, key_funcs)
+	keys_2 = keys_1 if records_2 is None else _record_keys(records_2, key_funcs)
+	n_pair = len(records)*(len(records)-1)//2 if records_2 is None else len(records)*len(records_2)
+	stats = _init_stats(stats, n_pair)
+
+	blocks_1, blocks_2 = defaultdict(list), defaultdict(list)
+	for index, keys in enumerate(keys_1):
+		for key in keys: blocks_1[key].append(index)
+	if records_2 is None:
+		blocks_2 = blocks_1
+	else:
+		for index, keys in enumerate(keys_2):
+			for key in keys: blocks_2[key].append(index)
+
+	# Drop oversized blocks from the record keys too, otherwise a pair could be attributed to a skipped block
+	shared_keys = sorted(key for key in blocks_1 if key in blocks_2)
+	skipped = set()
+	if max_block_size is not None:
+		skipped = {key for key in shared_keys if len(blocks_1[key]) > max_block_size or len(blocks_2[key]) > max_block_size}
+		shared_keys = [key for key in shared_keys if key not in skipped]
+		if skipped:
+			keys_1 = [keys - skipped for keys in keys_1]
+			keys_2 = keys_1 if records_2 is None else [keys - skipped for keys in keys_2]
+	if stats: stats.update({"n_block": len(shared_keys), "n_skipped_block": len(skipped)})
+
+	for key in shared_keys:
+		block_1, block_2 = blocks_1[key], blocks_2[key]
+		for position, index_1 in enumerate(block_1):
+			for index_2 in (block_1[position+1:] if records_2 is None else block_2):
+				# Blocks are visited in sorted key order, so the pair belongs to the first block it appears in
+				if min(keys_1[index_1] & keys_2[index_2]) != key: continue
+				if stats: stats["n_candidate"] += 1
+				yield index_1, index_2
+	_update_reduction_ratio(stats)
+
+@input_validator(list, records_2=(list, type(None)), window=int, stats=(dict, type(None)))
+def sorted_neighbourhood_pairs(records, records_2=None, key_func=sorted_token_blocking_key, window=5, stats=None):
+	"""
+	Stream candidate pairs of records that fall within a sliding window after sorting by a key
+	|
+	| Argument
+	| | records: list of text phrases
+	|
+	| Parameter
+	| | records_2: list of text phrases to link against records, pairs within records are generated if not given
+	| | key_func: function mapping a phrase to a list of keys, the first key is used for sorting
+	| |   and records without any key are left out
+	| | window: number of consecutive records in sorted order compared with each other
+	| | stats: dictionary filled with pair and candidate counts and the reduction ratio while streaming
+	|
+	| Output
+	| | generator of (index_1, index_2), index_2 refers to records_2 if given and index_1 < index_2 otherwise (type: generator[tuple])
+	"""
+	assert window >= 2, "Illegal window input: {}".format(window)
+	n_pair = len(records)*(len(records)-1)//2 if records_2 is None else len(records)*len(records_2)
+	stats = _init_stats(stats, n_pair)
+
+	entries = []
+	for source, source_records in enumerate([records] if records_2 is None else [records, records_2]):
+		for index, record in enumerate(source_records):
+			keys = key_func(record)
+			if keys: entries.append((keys[0], source, index))
+	entries.sort()
+
+	for position, (_, source, index) in enumerate(entries):
+		for _, other_source, other_index in entries[position+1:position+window]:
+			if records_2 is None:
+				pair = (index, other_index) if index < other_index else (other_index, index)
+			elif source != other_source:
+				pair = (index, other_index) if source == 0 else (other_index, index)
+			else:
+				continue
+			if stats: stats["n_candidate"] += 1
+			yield pair
+	_update_reduction_ratio(stats)
+
+@input_validator(list, object, (int, float), records_2=(list, type(None)), window=(int, type(None)), max_block_size=(int, type(None)), stats=(dict, type(None)))
+def link_records(records, scorer, threshold, records_2=None, key_funcs=(prefix_blocking_key,), window=None, max_block_size=None, stats=None, **scorer_kwargs):
+	"""
+	Stream pairs of records whose similarity reaches a threshold, scoring only blocked candidate pairs
+	|
+	| Argument
+	| | records: list of text phrases
+	| | scorer: similarity function from this package, e.g. edit_distance.jaro_winkler_similarity
+	| | threshold: minimum similarity of a reported pair
+	|
+	| Parameter
+	| | records_2: list of text phrases to link against records, pairs within records are linked if not given
+	| | key_funcs: functions mapping a phrase to a list of blocking keys
+	| | window: use sorted neighbourhood with this window on the first key function instead of blocking
+	| | max_block_size: blocks with more records than this are skipped
+	| | stats: dictionary filled with pair, block and candidate counts and the reduction ratio while streaming
+	| | scorer_kwargs: passed on to the scorer
+	|
+	| Output
+	| | generator of (index_1, index_2, similarity) (type: generator[tuple])
+	"""
+	if window is None:
+		candidates = block_candidate_pairs(records, records_2=records_2, key_funcs=key_funcs, max_block_size=max_block_size, stats=stats)
+	else:
+		candidates = sorted_neighbourhood_pairs(records, records_2=records_2, key_func=key_funcs[0], window=window, stats=stats)
+	targets = records if records_2 is None else records_2
+	for index_1, index_2 in candidates:
+		similarity = scorer(records[index_1], targets[index_2], **scorer_kwargs)
+		if similarity >= threshold: yield index_1, index_2, similarity
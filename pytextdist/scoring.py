@@ -0,0 +1,296 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+import inspect
+import logging
+logger = logging.getLogger(__name__)
+
+from .input_validator import input_validator
+from .preprocessing import phrase_preprocessing, ngram_counter
+from .edit_distance import levenshtein_similarity
+
+EDIT_METRICS = (
+	"levenshtein_distance", "levenshtein_similarity",
+	"lcs_distance", "lcs_similarity",
+	"damerau_levenshtein_distance", "damerau_levenshtein_similarity",
+	"jaro_similarity", "jaro_winkler_similarity",
+	"hamming_distance", "hamming_similarity",
+)
+VECTOR_METRICS = ("cosine_similarity", "jaccard_similarity", "sorensen_dice_similarity", "qgram_similarity")
+METRICS = EDIT_METRICS + VECTOR_METRICS
+# Hamming metrics raise for phrases of different lengths, so they are only computed on request
+DEFAULT_METRICS = tuple(metric for metric in METRICS if not metric.startswith("hamming"))
+
+def _edit_dp(l_1, l_2, want_lev, want_lcs, want_dam):
+	"""
+	Run Levenshtein, longest common subsequence and Damerau-Levenshtein recurrences in one pass over the matrix
+	"""
+	len_1, len_2 = len(l_1), len(l_2)
+	lev_prev, lcs_prev = list(range(len_2+1)), [0] * (len_2+1)
+	dam_prev_2, dam_prev = None, list(range(len_2+1))
+	for i in range(1, len_1+1):
+		unit_1 = l_1[i-1]
+		lev_cur, lcs_cur, dam_cur = [i] + [0] * len_2, [0] * (len_2+1), [i] + [0] * len_2
+		for j in range(1, len_2+1):
+			same = unit_1 == l_2[j-1]
+			cost = 0 if same else 1
+			if want_lev:
+				lev_cur[j] = min(lev_prev[j-1]+cost, lev_prev[j]+1, lev_cur[j-1]+1)
+			if want_lcs:
+				lcs_cur[j] = lcs_prev[j-1] + 1 if same else max(lcs_cur[j-1], lcs_prev[j])
+			if want_dam:
+				value = min(dam_prev[j-1]+cost, dam_prev[j]+1, dam_cur[j-1]+1)
+				if i >= 2 and j >= 2 and l_1[i-2] == l_2[j-1] and unit_1 == l_2[j-2]:
+					value = min(value, dam_prev_2[j-2]+1)
+				dam_cur[j] = value
+		lev_prev, lcs_prev = lev_cur, lcs_cur
+		dam_prev_2, dam_prev = dam_prev, dam_cur
+	return lev_prev[-1], len_1 + len_2 - 2 * lcs_prev[-1], dam_prev[-1]
+
+def _jaro_match(l_1, l_2):
+	"""
+	Find number of matches and transpositions used by Jaro and Jaro-Winkler similarity
+	"""
+	len_1, len_2 = len(l_1), len(l_2)
+	search_step = max(max(len_1, len_2)//2-1, 0)
+	match_cnt = 0
+	available_1, available_2 = [True for _ in range(len_1)], [True for _ in range(len_2)]
+	match_1, match_2 = [], []
+	for index_1, char_1 in enumerate(l_1):
+		for index_2 in range(max(index_1-search_step, 0), min(index_1+search_step+1, len_2)):
+			if char_1 == l_2[index_2]:
+				if available_1[index_1] and available_2[index_2]:
+					match_cnt += 1
+					available_1[index_1], available_2[index_2] = False, False
+					match_1.append(index_1)
+					match_2.append(index_2)
+	if match_cnt == 0: return 0, 0
+	match_str_1 = [l_1[i] for i in sorted(match_1)]
+	match_str_2 = [l_2[i] for i in sorted(match_2)]
+	transpose_cnt = sum([1 for a, b in zip(match_str_1, match_str_2) if a != b])/2
+	return match_cnt, transpose_cnt
+
+def _edit_scores(l_1, l_2, metrics, p):
+	"""
+	Compute requested edit distance metrics from two preprocessed lists of edit units
+	"""
+	len_1, len_2 = len(l_1), len(l_2)
+	scores = {}
+	if len_1 == 0 or len_2 == 0:
+		for metric in metrics:
+			if metric.endswith("_distance"): scores[metric] = max(len_1, len_2)
+			else: scores[metric] = 1 if len_1 == 0 and len_2 == 0 else 0
+		return scores
+
+	want_lev = "levenshtein_distance" in metrics or "levenshtein_similarity" in metrics
+	want_lcs = "lcs_distance" in metrics or "lcs_similarity" in metrics
+	want_dam = "damerau_levenshtein_distance" in metrics or "damerau_levenshtein_similarity" in metrics
+	if want_lev or want_lcs or want_dam:
+		lev_d, lcs_d, dam_d = _edit_dp(l_1, l_2, want_lev, want_lcs, want_dam)
+		if "levenshtein_distance" in metrics: scores["levenshtein_distance"] = lev_d
+		if "levenshtein_similarity" in metrics: scores["levenshtein_similarity"] = 1 - lev_d/max(len_1,len_2)
+		if "lcs_distance" in metrics: scores["lcs_distance"] = lcs_d
+		if "lcs_similarity" in metrics: scores["lcs_similarity"] = 1 - lcs_d/(len_1+len_2)
+		if "damerau_levenshtein_distance" in metrics: scores["damerau_levenshtein_distance"] = dam_d
+		if "damerau_levenshtein_similarity" in metrics: scores["damerau_levenshtein_similarity"] = 1 - dam_d/max(len_1,len_2)
+
+	if "jaro_similarity" in metrics or "jaro_winkler_similarity" in metrics:
+		match_cnt, transpose_cnt = _jaro_match(l_1, l_2)
+		jaro_similarity = 0 if match_cnt == 0 else (match_cnt/len_1 + match_cnt/len_2 + (match_cnt-transpose_cnt)/match_cnt)/3
+		if "jaro_similarity" in metrics: scores["jaro_similarity"] = jaro_similarity
+		if "jaro_winkler_similarity" in metrics:
+			if match_cnt == 0:
+				scores["jaro_winkler_similarity"] = 0
+			else:
+				l_common_prefix, index = 0, 0
+				while l_common_prefix < 5 and index < len_1 and index < len_2:
+					if l_1[index] != l_2[index]: break
+					l_common_prefix += 1
+					index += 1
+				scores["jaro_winkler_similarity"] = jaro_similarity + l_common_prefix*p*(1-jaro_similarity)
+
+	if "hamming_distance" in metrics or "hamming_similarity" in metrics:
+		if len_1 != len_2: raise Exception("Can't calculate hamming distance between phrases of different lengths")
+		distance = 0
+		for x, y in zip(l_1, l_2): distance += (1 if x != y else 0)
+		if "hamming_distance" in metrics: scores["hamming_distance"] = distance
+		if "hamming_similarity" in metrics: scores["hamming_similarity"] = 1 - distance/len_1
+
+	return scores
+
+def _vector_scores(counter_1, counter_2, metrics):
+	"""
+	Compute requested vector similarity metrics from two n-gram counters with one set intersection
+	"""
+	scores = {}
+	unique_token_1, unique_token_2 = set(counter_1.keys()), set(counter_2.keys())
+	common_token = unique_token_1 & unique_token_2
+	n_common, n_union = len(common_token), len(unique_token_1) + len(unique_token_2) - len(common_token)
+
+	if "cosine_similarity" in metrics:
+		numerator = sum([counter_1[x] * counter_2[x] for x in common_token])
+		denominator = math.sqrt(sum([v**2 for v in counter_1.values()])) * math.sqrt(sum([v**2 for v in counter_2.values()]))
+		scores["cosine_similarity"] = numerator/denominator
+	if "jaccard_similarity" in metrics:
+		scores["jaccard_similarity"] = n_common/n_union
+	if "sorensen_dice_similarity" in metrics:
+		scores["sorensen_dice_similarity"] = 2 * n_common/(len(unique_token_1) + len(unique_token_2))
+	if "qgram_similarity" in metrics:
+		# sum|a-b| = sum a + sum b - 2 sum min(a,b) and sum max(a,b) = sum a + sum b - sum min(a,b)
+		total = sum(counter_1.values()) + sum(counter_2.values())
+		overlap = sum([min(counter_1[x], counter_2[x]) for x in common_token])
+		scores["qgram_similarity"] = 1 - (total - 2 * overlap)/(total - overlap)
+
+	return scores
+
+def _score_all(phrase_1, phrase_2, metrics, n, p, edit_grain, vector_grain, ngram_key, registry, preprocess_kwargs, token_memo, ngram_memo):
+	"""
+	Shared implementation of score_all and score_all_batch, memos keep preprocessing and n-gram counting per phrase
+	"""
+	edit_metrics = [metric for metric in metrics if metric in EDIT_METRICS]
+	vector_metrics = [metric for metric in metrics if metric in VECTOR_METRICS]
+
+	def preprocess(phrase, grain):
+		if (phrase, grain) not in token_memo: token_memo[(phrase, grain)] = phrase_preprocessing(phrase, grain=grain, **preprocess_kwargs)
+		return token_memo[(phrase, grain)]
+
+	def count(phrase):
+		if phrase not in ngram_memo:
+			if registry is None: ngram_memo[phrase] = ngram_counter(preprocess(phrase, vector_grain), n=n, key=ngram_key)
+			else: ngram_memo[phrase] = ngram_counter(preprocess(phrase, vector_grain), n=n, key=ngram_key, registry=registry)
+		return ngram_memo[phrase]
+
+	scores = {}
+	if edit_metrics: scores.update(_edit_scores(preprocess(phrase_1, edit_grain), preprocess(phrase_2, edit_grain), edit_metrics, p))
+	if vector_metrics: scores.update(_vector_scores(count(phrase_1), count(phrase_2), vector_metrics))
+	return {metric: scores[metric] for metric in metrics}
+
+def _check_metrics(metrics, p):
+	for metric in metrics: assert metric in METRICS, "Illegal metric input: {}".format(metric)
+	if "jaro_winkler_similarity" in metrics: assert 0 < p < 0.25, "Illegal p input: {}".format(p)
+
+@input_validator(str, str, metrics=(list, tuple), n=int, p=float)
+def score_all(phrase_1, phrase_2, metrics=DEFAULT_METRICS, n=1, p=0.1, edit_grain="char", vector_grain="word", ngram_key="str", collision_check=False, ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+	"""
+	Get several edit distance and vector similarity metrics between two text phrases in one go
+	|
+	| Each phrase is preprocessed once per grain, the Levenshtein, longest common subsequence and
+	| Damerau-Levenshtein matrices are filled in a single pass, Jaro and Jaro-Winkler share one match
+	| search, and all vector similarities share one n-gram count and one key intersection
+	|
+	| Argument
+	| | phrase_1, phrase_2: text phrases to compare
+	|
+	| Parameter
+	| | metrics: names of functions in edit_distance or vector_similarity to compute, all but Hamming by default
+	| | n: number of continuous tokens to group for vector similarity
+	| | p: constant scaling factor for Jaro-Winkler similarity, should not exceed 0.25
+	| | edit_grain: "char" or "word", grain for edit
+	| | vector_grain: "char" or "word", grain for building vector
+	| | ngram_key: "str", "tuple" or "hash", representation of n-grams (see preprocessing.ngram_counter)
+	| | collision_check: whether to verify "hash" keys against each other so that the result is exact,
+	| |   slower than ngram_key="tuple", which is exact already
+	|
+	| Parameter for preprocessing
+	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
+	| | ignore_space: whether to remove all spaces if grain is character
+	| | ignore_numeric: whether to remove all numeric characters
+	| | ignore_case: whether to convert all alpha characters to lower case
+	|
+	| Output
+	| | dictionary of metric name to value (type: dict)
+	"""
+	_check_metrics(metrics, p)
+	preprocess_kwargs = dict(ignore_non_alnumspc=ignore_non_alnumspc, ignore_space=ignore_space, ignore_numeric=ignore_numeric, ignore_case=ignore_case)
+	registry = {} if ngram_key == "hash" and collision_check else None
+	return _score_all(phrase_1, phrase_2, metrics, n, p, edit_grain, vector_grain, ngram_key, registry, preprocess_kwargs, {}, {})
+
+@input_validator(list, metrics=(list, tuple), n=int, p=float)
+def score_all_batch(pairs, metrics=DEFAULT_METRICS, n=1, p=0.1, edit_grain="char", vector_grain="word", ngram_key="str", collision_check=False, ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+	"""
+	Get several edit distance and vector similarity metrics for each pair of text phrases
+	|
+	| Same as score_all, with preprocessing and n-gram counting of a phrase reused by every pair it appears in
+	|
+	| Argument
+	| | pairs: list of (phrase_1, phrase_2) tuples to compare
+	|
+	| Parameter
+	| | see score_all
+	|
+	| Output
+	| | list of dictionaries of metric name to value (type: list[dict])
+	"""
+	_check_metrics(metrics, p)
+	preprocess_kwargs = dict(ignore_non_alnumspc=ignore_non_alnumspc, ignore_space=ignore_space, ignore_numeric=ignore_numeric, ignore_case=ignore_case)
+	registry = {} if ngram_key == "hash" and collision_check else None
+	token_memo, ngram_memo = {}, {}
+	return [_score_all(phrase_1, phrase_2, metrics, n, p, edit_grain, vector_grain, ngram_key, registry, preprocess_kwargs, token_memo, ngram_memo) for phrase_1, phrase_2 in pairs]
+
+def _condensed_index(n_phrase, index_1, index_2):
+	"""
+	Position of pair (index_1, index_2) with index_1 < index_2 in a condensed upper triangle, same layout as scipy.spatial.distance.pdist
+	"""
+	return n_phrase*index_1 - index_1*(index_1+1)//2 + index_2 - index_1 - 1
+
+def _group_duplicates(phrases, scorer, scorer_kwargs):
+	"""
+	Indices of phrases grouped by their preprocessed units, so that phrases the scorer can't tell apart are scored once
+	"""
+	params = inspect.signature(scorer).bind_partial(**scorer_kwargs)
+	params.apply_defaults()
+	params = params.arguments
+	preprocess = "grain" in params and all(name in params for name in ("ignore_non_alnumspc", "ignore_space", "ignore_numeric", "ignore_case"))
+	groups = {}
+	for index, phrase in enumerate(phrases):
+		key = tuple(phrase_preprocessing(phrase, grain=params["grain"], ignore_non_alnumspc=params["ignore_non_alnumspc"], ignore_space=params["ignore_space"], ignore_numeric=params["ignore_numeric"], ignore_case=params["ignore_case"])) if preprocess else phrase
+		groups.setdefault(key, []).append(index)
+	return list(groups.values())
+
+@input_validator(list, threshold=(int, float, type(None)))
+def pdist(phrases, scorer=levenshtein_similarity, threshold=None, largest=True, **scorer_kwargs):
+	"""
+	Get the score of every pair of text phrases within one list, scoring each distinct pair once
+	|
+	| Phrases with the same units after preprocessing are scored once as a group, pairs inside a group get the
+	| score of the phrase with itself, and each unordered pair of groups is scored once
+	|
+	| Argument
+	| | phrases: list of text phrases
+	|
+	| Parameter
+	| | scorer: function from edit_distance or vector_similarity
+	| | threshold: return only pairs scoring at least this (at most if not largest), as a sparse list
+	| | largest: whether a higher score is better, pass False for distances
+	| | scorer_kwargs: passed on to the scorer
+	|
+	| Output
+	| | condensed upper triangle, the score of pair (i, j) with i < j at n*i - i*(i+1)/2 + j - i - 1 (type: list)
+	| | or, if threshold is given, sorted list of (index_1, index_2, score) with index_1 < index_2 (type: list[tuple])
+	"""
+	n_phrase = len(phrases)
+	groups = _group_duplicates(phrases, scorer, scorer_kwargs)
+	keep = (lambda score: True) if threshold is None else (lambda score: score >= threshold if largest else score <= threshold)
+	condensed = [None] * (n_phrase*(n_phrase-1)//2) if threshold is None else None
+	sparse = []
+
+	def emit(group_1, group_2, score):
+		if not keep(score): return
+		for index_1 in group_1:
+			for index_2 in group_2:
+				if index_1 == index_2: continue
+				pair = (index_1, index_2) if index_1 < index_2 else (index_2, index_1)
+				if condensed is None: sparse.append(pair + (score,))
+				else: condensed[_condensed_index(n_phrase, *pair)] = score
+
+	for position, group_1 in enumerate(groups):
+		phrase_1 = phrases[group_1[0]]
+		# Within a group each pair appears once by keeping index_1 < index_2
+		if len(group_1) > 1:
+			score = scorer(phrase_1, phrase_1, **scorer_kwargs)
+			for rank, index_1 in enumerate(group_1): emit([index_1], group_1[rank+1:], score)
+		for group_2 in groups[position+1:]:
+			emit(group_1, group_2, scorer(phrase_1, phrases[group_2[0]], **scorer_kwargs))
+	return condensed if threshold is None else sorted(sparse)
@@ -0,0 +1,188 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import json
+import heapq
+import hashlib
+import logging
+logger = logging.getLogger(__name__)
+
+from .input_validator import input_validator
+from .cache import _parameter_digest
+
+def shard_of(phrase, n_shard):
+	"""
+	Shard of a text phrase, stable across processes, machines and Python versions
+	|
+	| Argument
+	| | phrase: text phrase
+	| | n_shard: number of shards
+	|
+	| Output
+	| | shard number in [0, n_shard) (type: int)
+	"""
+	return int(hashlib.md5(phrase.encode("utf-8")).hexdigest()[:15], 16) % n_shard
+
+def _fingerprint(queries, choices):
+	"""
+	Digest of both inputs, so that partial results of different inputs are never merged
+	"""
+	digest = hashlib.sha256()
+	for phrases in (queries, choices):
+		digest.update(str(len(phrases)).encode("utf-8"))
+		for phrase in phrases: digest.update(hashlib.sha256(phrase.encode("utf-8")).digest())
+	return digest.hexdigest()
+
+def _append_record(path, record, mode="a"):
+	# One JSON line per checkpoint, so writing a checkpoint costs the new results only
+	with open(path, mode) as f: f.write(json.dumps(record) + "\n")
+
+def _read_partial(path):
+	"""
+	Partial result replayed from the lines of a checkpoint file, and the size of its valid part
+	|
+	| A crash while appending leaves a last line without newline or not parsing, it is ignored
+	"""
+	partial, size = None, 0
+	with open(path, "rb") as f:
+		for line in f:
+			try:
+				record = json.loads(line.decode("utf-8")) if line.endswith(b"\n") else None
+			except ValueError:
+				record = None
+			if record is None: break
+			if partial is None:
+				partial = {"config": record["config"], "shard": record["shard"], "position": 0, "complete": False, "top_k": {}, "hits": [], "counters": {"n_query": 0, "n_pair": 0, "n_hit": 0}}
+			else:
+				partial["top_k"].update(record["top_k"])
+				partial["hits"].extend(record["hits"])
+				partial.update({"position": record["position"], "counters": record["counters"], "complete": record["complete"]})
+			size += len(line)
+	return partial, size
+
+def _order(score, choice_index, largest):
+	"""
+	Sort key of a (score, choice) under which better results come first, ties go to the lower choice index
+	"""
+	return (-score if largest else score, choice_index)
+
+@input_validator(list, list, object, int, int, by=str, top_k=(int, type(None)), threshold=(int, float, type(None)), path=(str, type(None)), checkpoint_every=int)
+def score_shard(queries, choices, scorer, shard, n_shard, by="queries", top_k=5, threshold=None, largest=True, path=None, checkpoint_every=1000, **scorer_kwargs):
+	"""
+	Score one shard of all (query, choice) pairs and keep a partial result that merge_partial_results can combine
+	|
+	| Pairs are partitioned by a stable hash of the query or of the choice, so every shard can run on a different
+	| machine and the union of all shards covers every pair exactly once
+	|
+	| Argument
+	| | queries: list of text phrases to match
+	| | choices: list of text phrases to match against
+	| | scorer: function from this package, e.g. edit_distance.jaro_winkler_similarity
+	| | shard: number of this shard, in [0, n_shard)
+	| | n_shard: number of shards
+	|
+	| Parameter
+	| | by: "queries" or "choices", which phrases are partitioned
+	| | top_k: number of best choices kept per query, none if None
+	| | threshold: keep every pair scoring at least this (at most if not largest), none if None
+	| | largest: whether a higher score is better, pass False for distances
+	| | path: JSON lines file for the partial result, an unfinished one with the same settings is resumed
+	| | checkpoint_every: number of queries between two checkpoints, each appends the results since the last one to path
+	| | scorer_kwargs: passed on to the scorer
+	|
+	| Output
+	| | partial result holding the settings, per-query top k, threshold hits and counters (type: dict)
+	"""
+	assert by in ("queries", "choices"), "Illegal by input: {}".format(by)
+	assert 0 <= shard < n_shard, "Illegal shard input: {}".format(shard)
+	assert checkpoint_every > 0, "Illegal checkpoint_every input: {}".format(checkpoint_every)
+	config = {
+		"scorer": "{}.{}".format(scorer.__module__, scorer.__name__), "scorer_kwargs": _parameter_digest(scorer_kwargs),
+		"by": by, "n_shard": n_shard, "top_k": top_k, "threshold": threshold, "largest": largest, "fingerprint": _fingerprint(queries, choices),
+	}
+
+	partial = None
+	if path is not None and os.path.exists(path):
+		partial, size = _read_partial(path)
+		if partial is not None:
+			if partial["config"] != config or partial["shard"] != shard: raise Exception("Partial result at {} was written with different settings".format(path))
+			if partial["complete"]: return partial
+			logger.info("Resuming shard {} from query {}".format(shard, partial["position"]))
+			# Drop a line left half written by the crash, the next checkpoint is appended after the valid ones
+			os.truncate(path, size)
+	if partial is None:
+		partial = {"config": config, "shard": shard, "position": 0, "complete": False, "top_k": {}, "hits": [], "counters": {"n_query": 0, "n_pair": 0, "n_hit": 0}}
+		if path is not None: _append_record(path, {"config": config, "shard": shard}, mode="w")
+
+	in_shard = [shard_of(phrase, n_shard) == shard for phrase in (queries if by == "queries" else choices)]
+	choice_indices = range(len(choices)) if by == "queries" else [index for index, flag in enumerate(in_shard) if flag]
+	counters = partial["counters"]
+	# Results since the last checkpoint, the only ones the next checkpoint has to write
+	new_top_k, new_hits = {}, []
+	def checkpoint():
+		_append_record(path, {"position": partial["position"], "complete": partial["complete"], "top_k": new_top_k, "hits": new_hits, "counters": counters})
+		new_top_k.clear()
+		del new_hits[:]
+
+	for query_index in range(partial["position"], len(queries)):
+		if by == "choices" or in_shard[query_index]:
+			heap = []
+			for choice_index in choice_indices:
+				score = scorer(queries[query_index], choices[choice_index], **scorer_kwargs)
+				counters["n_pair"] += 1
+				if threshold is not None and (score >= threshold if largest else score <= threshold):
+					partial["hits"].append([query_index, choice_index, score])
+					new_hits.append([query_index, choice_index, score])
+					counters["n_hit"] += 1
+				if top_k is not None:
+					# Heap of the k best so far with the worst on top, negated order so that heapq pops the worst
+					item = tuple(-x for x in _order(score, choice_index, largest)) + (score,)
+					if len(heap) < top_k: heapq.heappush(heap, item)
+					elif item > heap[0]: heapq.heapreplace(heap, item)
+			if top_k is not None and heap:
+				partial["top_k"][str(query_index)] = new_top_k[str(query_index)] = [[-item[1], item[2]] for item in sorted(heap, reverse=True)]
+			# With choices partitioned every shard sees every query, which is counted by shard 0 only
+			if by == "queries" or shard == 0: counters["n_query"] += 1
+		partial["position"] = query_index + 1
+		if path is not None and partial["position"] % checkpoint_every == 0: checkpoint()
+
+	partial["complete"] = True
+	if path is not None: checkpoint()
+	return partial
+
+@input_validator(list)
+def merge_partial_results(partials):
+	"""
+	Combine the partial results of every shard into the result of a single run over all pairs
+	|
+	| Argument
+	| | partials: list of partial results or paths of their JSON lines files, one per shard
+	|
+	| Output
+	| | dictionary with "top_k": {query_index: [(choice_index, score), ...]} best first, "hits": sorted list of
+	| | (query_index, choice_index, score), and "counters": summed counts of queries, pairs and hits (type: dict)
+	"""
+	loaded = []
+	for partial in partials:
+		if isinstance(partial, str):
+			path, (partial, _) = partial, _read_partial(partial)
+			if partial is None: raise Exception("No partial result at {}".format(path))
+		loaded.append(partial)
+	assert loaded, "Illegal partials input: no partial result"
+	config = loaded[0]["config"]
+	for partial in loaded:
+		if partial["config"] != config: raise Exception("Can't merge partial results written with different settings")
+		if not partial["complete"]: raise Exception("Shard {} is not complete".format(partial["shard"]))
+	shards = sorted(partial["shard"] for partial in loaded)
+	if shards != list(range(config["n_shard"])): raise Exception("Expect one partial result per shard in [0, {}) but get shards {}".format(config["n_shard"], shards))
+
+	top_k, hits, counters = {}, [], {}
+	for partial in loaded:
+		for query_index, results in partial["top_k"].items(): top_k.setdefault(int(query_index), []).extend(results)
+		hits.extend([tuple(hit) for hit in partial["hits"]])
+		for name, value in partial["counters"].items(): counters[name] = counters.get(name, 0) + value
+	largest = config["largest"]
+	top_k = {query_index: [(choice_index, score) for choice_index, score in sorted(results, key=lambda result: _order(result[1], result[0], largest))[:config["top_k"]]] for query_index, results in sorted(top_k.items())}
+	return {"top_k": top_k, "hits": sorted(hits), "counters": counters}
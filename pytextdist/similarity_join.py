@@ -0,0 +1,159 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import Counter, defaultdict
+
+from .input_validator import input_validator
+from .preprocessing import phrase_preprocessing, ngram_counter
+
+# Slack so that float rounding in the bounds never prunes a qualifying pair
+_EPS = 1e-9
+
+def _required_overlap(metric, threshold, size_1, size_2):
+	"""
+	Minimum number of shared n-grams for two sets of given sizes to reach the threshold
+	"""
+	if metric == "jaccard_similarity": return math.ceil(threshold/(1+threshold)*(size_1+size_2) - _EPS)
+	return math.ceil(threshold*(size_1+size_2)/2 - _EPS)
+
+def _size_bounds(metric, threshold, size):
+	"""
+	Range of set sizes that can reach the threshold with a set of given size
+	"""
+	if metric == "jaccard_similarity": return threshold*size - _EPS, size/threshold + _EPS
+	return threshold*size/(2-threshold) - _EPS, (2-threshold)*size/threshold + _EPS
+
+def _prefix_length(metric, threshold, record):
+	"""
+	Number of leading tokens (in global order) of which any qualifying partner must share at least one
+	"""
+	if metric == "cosine_similarity":
+		# Tokens after the prefix have norm below the threshold, so they alone can't reach it by Cauchy-Schwarz
+		norm_sq, suffix_sq, length = sum([weight**2 for _, weight in record]), 0, len(record)
+		while length > 0 and suffix_sq + record[length-1][1]**2 < threshold**2 * norm_sq * (1-_EPS):
+			suffix_sq += record[length-1][1]**2
+			length -= 1
+		return length
+	size = len(record)
+	if metric == "jaccard_similarity": return size - math.ceil(threshold*size - _EPS) + 1
+	return size - math.ceil(threshold*size/(2-threshold) - _EPS) + 1
+
+def _similarity(metric, counter_1, counter_2):
+	"""
+	Same formulas as vector_similarity so that joined pairs carry identical scores
+	"""
+	if metric == "cosine_similarity":
+		numerator = sum([counter_1[x] * counter_2[x] for x in set(counter_1.keys()) & set(counter_2.keys())])
+		denominator = math.sqrt(sum([v**2 for v in counter_1.values()])) * math.sqrt(sum([v**2 for v in counter_2.values()]))
+		return numerator/denominator
+	unique_token_1, unique_token_2 = set(counter_1.keys()), set(counter_2.keys())
+	if metric == "jaccard_similarity": return len(unique_token_1 & unique_token_2)/len(unique_token_1 | unique_token_2)
+	return 2 * len(unique_token_1 & unique_token_2)/(len(unique_token_1) + len(unique_token_2))
+
+def _probe(metric, threshold, record, prefix, index, records):
+	"""
+	Collect candidates sharing a prefix token with record, applying length and positional filters for set metrics
+	"""
+	overlap = {}
+	size = len(record)
+	lower, upper = _size_bounds(metric, threshold, size) if metric != "cosine_similarity" else (0, float("inf"))
+	for position in range(prefix):
+		for other, other_position in index.get(record[position][0], ()):
+			other_size = len(records[other])
+			if other_size < lower or other_size > upper: continue
+			count = overlap.get(other, 0)
+			if count < 0: continue
+			if metric == "cosine_similarity":
+				overlap[other] = count + 1
+				continue
+			# Positional filter: shared tokens so far plus what is left after both positions must reach the overlap
+			bound = count + 1 + min(size-position-1, other_size-other_position-1)
+			overlap[other] = count + 1 if bound >= _required_overlap(metric, threshold, size, other_size) else -1
+	return [other for other, count in overlap.items() if count > 0]
+
+@input_validator(list, phrases_2=(list, type(None)), threshold=(int, float), n=int)
+def similarity_join(phrases_1, phrases_2=None, threshold=0.8, metric="jaccard_similarity", n=1, grain="word", ngram_key="str", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+	"""
+	Find all pairs of text phrases whose vector similarity reaches a threshold, without comparing every pair
+	|
+	| Follows AllPairs / PPJoin: n-grams are ordered globally by increasing frequency, and only pairs sharing a
+	| token in their prefixes under that order are scored, after length and positional filtering. The filters
+	| are exact, so every qualifying pair is returned.
+	|
+	| Argument
+	| | phrases_1: list of text phrases
+	|
+	| Parameter
+	| | phrases_2: list of text phrases to join with phrases_1, pairs within phrases_1 are joined if not given
+	| | threshold: minimum similarity of a returned pair, in (0, 1]
+	| | metric: "jaccard_similarity", "sorensen_dice_similarity" or "cosine_similarity"
+	| | n: number of continuous tokens to group
+	| | grain: "char" or "word", grain for building vector
+	| | ngram_key: "str", "tuple" or "hash", representation of n-grams (see preprocessing.ngram_counter),
+	| |   "hash" keys are collision-checked so that results stay exact, "tuple" is exact and faster
+	|
+	| Parameter for preprocessing
+	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
+	| | ignore_space: whether to remove all spaces if grain is character
+	| | ignore_numeric: whether to remove all numeric characters
+	| | ignore_case: whether to convert all alpha characters to lower case
+	|
+	| Output
+	| | sorted list of (index_1, index_2, similarity), index_2 refers to phrases_2 if given and index_1 < index_2 otherwise,
+	| | phrases shorter than n units after preprocessing can't be scored and are left out (type: list[tuple])
+	"""
+	assert metric in ("jaccard_similarity", "sorensen_dice_similarity", "cosine_similarity"), "Illegal metric input: {}".format(metric)
+	assert 0 < threshold <= 1, "Illegal threshold input: {}".format(threshold)
+
+	# Collision-checked hash keys, otherwise colliding n-grams would merge and change set sizes and overlaps
+	registry = {} if ngram_key == "hash" else None
+
+	def count(phrase):
+		l_token = phrase_preprocessing(phrase, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
+		return ngram_counter(l_token, n=n, key=ngram_key, registry=registry) if len(l_token) >= n else None
+
+	counters_1 = [count(phrase) for phrase in phrases_1]
+	counters_2 = counters_1 if phrases_2 is None else [count(phrase) for phrase in phrases_2]
+
+	# Global order: rare n-grams first, ties broken by first occurrence so that the order is deterministic
+	# (n-grams are not comparable with each other when hash keys fall back to tuples)
+	frequency = Counter()
+	for counter in (counters_1 if phrases_2 is None else counters_1 + counters_2):
+		if counter is not None: frequency.update(counter.keys())
+	rank = {token: position for position, token in enumerate(sorted(frequency, key=lambda token: frequency[token]))}
+
+	def build(counter):
+		if counter is None: return None
+		if metric == "cosine_similarity": return sorted([(rank[token], cnt) for token, cnt in counter.items()])
+		return sorted([(rank[token], 1) for token in counter])
+
+	records_1 = [build(counter) for counter in counters_1]
+	records_2 = records_1 if phrases_2 is None else [build(counter) for counter in counters_2]
+
+	result = []
+	index = defaultdict(list)
+	if phrases_2 is None:
+		# Self join: visit records by increasing size and index each prefix after probing it
+		for record_id in sorted([i for i, record in enumerate(records_1) if record is not None], key=lambda i: len(records_1[i])):
+			record = records_1[record_id]
+			prefix = _prefix_length(metric, threshold, record)
+			for other in _probe(metric, threshold, record, prefix, index, records_1):
+				similarity = _similarity(metric, counters_1[record_id], counters_1[other])
+				if similarity >= threshold: result.append((min(record_id, other), max(record_id, other), similarity))
+			for position in range(prefix): index[record[position][0]].append((record_id, position))
+	else:
+		for record_id, record in enumerate(records_2):
+			if record is None: continue
+			for position in range(_prefix_length(metric, threshold, record)): index[record[position][0]].append((record_id, position))
+		for record_id, record in enumerate(records_1):
+			if record is None: continue
+			for other in _probe(metric, threshold, record, _prefix_length(metric, threshold, record), index, records_2):
+				similarity = _similarity(metric, counters_1[record_id], counters_2[other])
+				if similarity >= threshold: result.append((record_id, other, similarity))
+
+	return sorted(result)
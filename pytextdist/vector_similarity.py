@@ -9,8 +9,17 @@ logger = logging.getLogger(__name__)
 from .input_validator import input_validator
 from .preprocessing import phrase_preprocessing, ngram_counter
 
+def _ngram_counter_pair(l_1, l_2, n, ngram_key, collision_check):
+	"""
+	Count n-grams of two token lists with the same key representation, sharing one hash registry if requested
+	"""
+	if ngram_key == "hash" and collision_check:
+		registry = {}
+		return ngram_counter(l_1, n=n, key=ngram_key, registry=registry), ngram_counter(l_2, n=n, key=ngram_key, registry=registry)
+	return ngram_counter(l_1, n=n, key=ngram_key), ngram_counter(l_2, n=n, key=ngram_key)
+
 @input_validator(str, str, n=int)
-def cosine_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+def cosine_similarity(phrase_1, phrase_2, n=1, grain="word", ngram_key="str", collision_check=False, ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
 	"""
 	Get cosine similarity between two text phrases
 	|
@@ -20,6 +29,9 @@ def cosine_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_alnumspc
 	| Parameter
 	| | n: number of continuous tokens to group
 	| | grain: "char" or "word", grain for building vector
+	| | ngram_key: "str", "tuple" or "hash", representation of n-grams (see preprocessing.ngram_counter)
+	| | collision_check: whether to verify "hash" keys against each other so that the result is exact,
+	| |   slower than ngram_key="tuple", which is exact already
 	|
 	| Parameter for preprocessing
 	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
@@ -31,9 +43,8 @@ def cosine_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_alnumspc
 	| | similarity (type: float)
 	"""
 	l_1 = phrase_preprocessing(phrase_1, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
-	counter_1 = ngram_counter(l_1, n=n)
 	l_2 = phrase_preprocessing(phrase_2, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
-	counter_2 = ngram_counter(l_2, n=n)
+	counter_1, counter_2 = _ngram_counter_pair(l_1, l_2, n, ngram_key, collision_check)
 
 	numerator = sum([counter_1[x] * counter_2[x] for x in set(counter_1.keys()) & set(counter_2.keys())])
 	denominator = math.sqrt(sum([v**2 for v in counter_1.values()])) * math.sqrt(sum([v**2 for v in counter_2.values()]))
@@ -42,7 +53,7 @@ def cosine_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_alnumspc
 	return similarity
 
 @input_validator(str, str, n=int)
-def jaccard_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+def jaccard_similarity(phrase_1, phrase_2, n=1, grain="word", ngram_key="str", collision_check=False, ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
 	"""
 	Get jaccard similarity between two text phrases
 	|
@@ -52,6 +63,9 @@ def jaccard_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_alnumsp
 	| Parameter
 	| | n: number of continuous tokens to group
 	| | grain: "char" or "word", grain for building vector
+	| | ngram_key: "str", "tuple" or "hash", representation of n-grams (see preprocessing.ngram_counter)
+	| | collision_check: whether to verify "hash" keys against each other so that the result is exact,
+	| |   slower than ngram_key="tuple", which is exact already
 	|
 	| Parameter for preprocessing
 	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
@@ -63,11 +77,9 @@ def jaccard_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_alnumsp
 	| | similarity (type: float)
 	"""
 	l_1 = phrase_preprocessing(phrase_1, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
-	counter_1 = ngram_counter(l_1, n=n)
-	unique_token_1 = set(counter_1.keys())
 	l_2 = phrase_preprocessing(phrase_2, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
-	counter_2 = ngram_counter(l_2, n=n)
-	unique_token_2 = set(counter_2.keys())
+	counter_1, counter_2 = _ngram_counter_pair(l_1, l_2, n, ngram_key, collision_check)
+	unique_token_1, unique_token_2 = set(counter_1.keys()), set(counter_2.keys())
 
 	numerator = len(unique_token_1 & unique_token_2)
 	denominator = len(unique_token_1 | unique_token_2)
@@ -76,7 +88,7 @@ def jaccard_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_alnumsp
 	return similarity
 
 @input_validator(str, str, n=int)
-def sorensen_dice_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+def sorensen_dice_similarity(phrase_1, phrase_2, n=1, grain="word", ngram_key="str", collision_check=False, ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
 	"""
 	Get Sorense Dice similarity between two text phrases
 	|
@@ -86,6 +98,9 @@ def sorensen_dice_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_a
 	| Parameter
 	| | n: number of continuous tokens to group
 	| | grain: "char" or "word", grain for building vector
+	| | ngram_key: "str", "tuple" or "hash", representation of n-grams (see preprocessing.ngram_counter)
+	| | collision_check: whether to verify "hash" keys against each other so that the result is exact,
+	| |   slower than ngram_key="tuple", which is exact already
 	|
 	| Parameter for preprocessing
 	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
@@ -97,11 +112,9 @@ def sorensen_dice_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_a
 	| | similarity (type: float)
 	"""
 	l_1 = phrase_preprocessing(phrase_1, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
-	counter_1 = ngram_counter(l_1, n=n)
-	unique_token_1 = set(counter_1.keys())
 	l_2 = phrase_preprocessing(phrase_2, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
-	counter_2 = ngram_counter(l_2, n=n)
-	unique_token_2 = set(counter_2.keys())
+	counter_1, counter_2 = _ngram_counter_pair(l_1, l_2, n, ngram_key, collision_check)
+	unique_token_1, unique_token_2 = set(counter_1.keys()), set(counter_2.keys())
 
 	numerator = 2 * len(unique_token_1 & unique_token_2)
 	denominator = len(unique_token_1) + len(unique_token_2)
@@ -110,7 +123,7 @@ def sorensen_dice_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_a
 	return similarity
 
 @input_validator(str, str, n=int)
-def qgram_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
+def qgram_similarity(phrase_1, phrase_2, n=1, grain="word", ngram_key="str", collision_check=False, ignore_non_alnumspc=True, ignore_space=True, ignore_numeric=True, ignore_case=True):
 	"""
 	Get Q-Gram similarity between two text phrases
 	|
@@ -120,6 +133,9 @@ def qgram_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_alnumspc=
 	| Parameter
 	| | n: number of continuous tokens to group
 	| | grain: "char" or "word", grain for building vector
+	| | ngram_key: "str", "tuple" or "hash", representation of n-grams (see preprocessing.ngram_counter)
+	| | collision_check: whether to verify "hash" keys against each other so that the result is exact,
+	| |   slower than ngram_key="tuple", which is exact already
 	|
 	| Parameter for preprocessing
 	| | ignore_non_alnumspc: whether to remove all non alpha/numeric/space characters
@@ -131,29 +147,11 @@ def qgram_similarity(phrase_1, phrase_2, n=1, grain="word", ignore_non_alnumspc=
 	| | similarity (type: float)
 	"""
 	l_1 = phrase_preprocessing(phrase_1, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
-	counter_1 = ngram_counter(l_1, n=n)
 	l_2 = phrase_preprocessing(phrase_2, grain=grain, ignore_non_alnumspc=ignore_non_alnumspc, ignore_numeric=ignore_numeric, ignore_case=ignore_case, ignore_space=ignore_space)
-	counter_2 = ngram_counter(l_2, n=n)
+	counter_1, counter_2 = _ngram_counter_pair(l_1, l_2, n, ngram_key, collision_check)
 
 	numerator = sum([abs(counter_1.get(key,0)-counter_2.get(key,0)) for key in set(counter_1.keys())|set(counter_2.keys())])
 	denominator = sum([max(counter_1.get(key,0), counter_2.get(key,0)) for key in set(counter_1.keys())|set(counter_2.keys())])
 	similarity = 1 -  numerator/denominator
 
 	return similarity
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
@@ -12,6 +12,7 @@ setuptools.setup(
 	long_description=readme_description,
     long_description_content_type="text/markdown",
     packages=setuptools.find_packages(),
+    extras_require={"numpy": ["numpy"]},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
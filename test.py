@@ -1,3 +1,9 @@
+import os
+import sys
+import importlib.util
+import tempfile
+import time
+import subprocess
 import unittest
 import pytextdist
 
@@ -33,12 +39,191 @@ class pytextdist_test(parametrizedTestCase):
 		self.assertEqual(round(pytextdist.edit_distance.jaro_similarity(self.kwargs["phrase_1"], self.kwargs["phrase_2"]),2), self.kwargs["d_jaro"])
 		self.assertEqual(round(pytextdist.edit_distance.jaro_winkler_similarity(self.kwargs["phrase_1"], self.kwargs["phrase_2"]),2), self.kwargs["d_jaro_wi"])
 
+	def test_alignment(self):
+		self.assertEqual(len(pytextdist.edit_distance.levenshtein_alignment(self.kwargs["phrase_1"], self.kwargs["phrase_2"])), self.kwargs["lev_d"])
+		self.assertEqual(len(pytextdist.edit_distance.lcs_alignment(self.kwargs["phrase_1"], self.kwargs["phrase_2"])), self.kwargs["lcs_d"])
+		self.assertEqual(pytextdist.edit_distance.levenshtein_alignment("kitten", "sitting"), [("replace", 0, 0), ("replace", 4, 4), ("insert", 6, 6)])
+		self.assertEqual(pytextdist.edit_distance.lcs_alignment("the old cat", "the cat sat", grain="word"), [("delete", 1, 1), ("insert", 3, 2)])
+
+	@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+	def test_weighted_levenshtein(self):
+		self.assertEqual(pytextdist.edit_distance.weighted_levenshtein_distance(self.kwargs["phrase_1"], self.kwargs["phrase_2"]), self.kwargs["lev_d"])
+		ocr_costs = {("o", "0"): 0.1, ("l", "1"): 0.1}
+		self.assertEqual(pytextdist.edit_distance.weighted_levenshtein_distance("l00k", "look", substitute_costs={("0", "o"): 0.25}, ignore_numeric=False), 0.5)
+		self.assertEqual(pytextdist.edit_distance.weighted_levenshtein_distance("kitten", "sitting", insert_costs={"g": 0.5}, delete_costs=2), 2.5)
+		choices = ["l0ve", "love", "1ove", "", self.kwargs["phrase_2"]]
+		self.assertEqual(pytextdist.edit_distance.weighted_levenshtein_distance_batch("love", choices, substitute_costs=ocr_costs, ignore_numeric=False), [0.1, 0, 0.1, 4, pytextdist.edit_distance.levenshtein_distance("love", self.kwargs["phrase_2"])])
+		# Choices of very different lengths are scored in separate groups and returned in input order
+		choices = ["lo", "v" * 200, "glove", "", "lovely" * 5, "o"]
+		self.assertEqual(pytextdist.edit_distance.weighted_levenshtein_distance_batch("love", choices), [pytextdist.edit_distance.levenshtein_distance("love", choice) for choice in choices])
+
+	def test_approximate_levenshtein(self):
+		document = " ".join([self.kwargs["sentence_1"], self.kwargs["phrase_1"], self.kwargs["sentence_2"]] * 5)
+		revised = document.replace("Privacy", "Secrecy", 1).replace("separate", "", 1)
+		distance, lower_bound = pytextdist.edit_distance.approximate_levenshtein_distance(document, revised, k=6)
+		self.assertTrue(lower_bound <= pytextdist.edit_distance.levenshtein_distance(document, revised) <= distance)
+		distance, lower_bound = pytextdist.edit_distance.approximate_levenshtein_distance(document, document.replace("Privacy", "Secrecy"), k=6)
+		self.assertTrue(0 < lower_bound <= distance)
+		self.assertEqual(pytextdist.edit_distance.approximate_levenshtein_distance(self.kwargs["phrase_1"], self.kwargs["phrase_2"], k=2)[0], self.kwargs["lev_d"])
+
 	def test_vector_similarity(self):
 		self.assertEqual(round(pytextdist.vector_similarity.cosine_similarity(self.kwargs["sentence_1"], self.kwargs["sentence_2"]), 2), self.kwargs["cos_s"])
 		self.assertEqual(round(pytextdist.vector_similarity.jaccard_similarity(self.kwargs["sentence_1"], self.kwargs["sentence_2"]), 2), self.kwargs["jac_s"])
 		self.assertEqual(round(pytextdist.vector_similarity.sorensen_dice_similarity(self.kwargs["sentence_1"], self.kwargs["sentence_2"]), 2), self.kwargs["sor_s"])
 		self.assertEqual(round(pytextdist.vector_similarity.qgram_similarity(self.kwargs["sentence_1"], self.kwargs["sentence_2"]), 2), self.kwargs["qgr_s"])
 
+	def test_ngram_key(self):
+		for func in (pytextdist.vector_similarity.cosine_similarity, pytextdist.vector_similarity.jaccard_similarity, pytextdist.vector_similarity.sorensen_dice_similarity, pytextdist.vector_similarity.qgram_similarity):
+			for n in (1, 3):
+				expected = func(self.kwargs["sentence_1"], self.kwargs["sentence_2"], n=n)
+				self.assertEqual(func(self.kwargs["sentence_1"], self.kwargs["sentence_2"], n=n, ngram_key="tuple"), expected)
+				self.assertEqual(func(self.kwargs["sentence_1"], self.kwargs["sentence_2"], n=n, ngram_key="hash"), expected)
+				self.assertEqual(func(self.kwargs["sentence_1"], self.kwargs["sentence_2"], n=n, ngram_key="hash", collision_check=True), expected)
+		tokens = pytextdist.preprocessing.sentence_preprocessing(self.kwargs["sentence_1"])
+		self.assertEqual(sorted(pytextdist.preprocessing.ngram_counter(tokens, n=2, key="tuple").values()), sorted(pytextdist.preprocessing.ngram_counter(tokens, n=2).values()))
+		registry = {hash(("for", "paperwork")): ("fake", "collision")}
+		self.assertEqual(pytextdist.preprocessing.ngram_counter(["for", "paperwork"], n=2, key="hash", registry=registry), {("for", "paperwork"): 1})
+
+	def test_scoring(self):
+		edit_metrics = ["levenshtein_distance", "lcs_distance", "damerau_levenshtein_distance", "jaro_similarity", "jaro_winkler_similarity", "hamming_distance"]
+		scores = pytextdist.scoring.score_all(self.kwargs["phrase_1"], self.kwargs["phrase_2"], metrics=edit_metrics)
+		for metric, ans in zip(edit_metrics, ["lev_d", "lcs_d", "d_lev_d", "d_jaro", "d_jaro_wi", "h_d"]):
+			self.assertEqual(round(scores[metric], 2), self.kwargs[ans])
+		for (phrase_1, phrase_2), scores in zip([(self.kwargs["sentence_1"], self.kwargs["sentence_2"])] * 2, pytextdist.scoring.score_all_batch([(self.kwargs["sentence_1"], self.kwargs["sentence_2"])] * 2, n=2)):
+			for metric in pytextdist.scoring.DEFAULT_METRICS:
+				kwargs = {"n": 2} if metric in pytextdist.scoring.VECTOR_METRICS else {}
+				self.assertEqual(scores[metric], getattr(pytextdist.edit_distance if metric in pytextdist.scoring.EDIT_METRICS else pytextdist.vector_similarity, metric)(phrase_1, phrase_2, **kwargs))
+
+	def test_record_linkage(self):
+		records = ["Acme Corp", "ACME corp.", "Corp Acme", "Zeta Ltd", self.kwargs["phrase_1"], self.kwargs["phrase_2"]]
+		key_funcs = [pytextdist.record_linkage.prefix_blocking_key, pytextdist.record_linkage.sorted_token_blocking_key]
+		stats = {}
+		pairs = list(pytextdist.record_linkage.block_candidate_pairs(records, key_funcs=key_funcs, stats=stats))
+		self.assertTrue({(0, 1), (0, 2), (1, 2)} <= set(pairs))
+		self.assertFalse(any(3 in pair for pair in pairs))
+		self.assertEqual(len(pairs), len(set(pairs)))
+		self.assertEqual(stats["n_candidate"], len(pairs))
+		self.assertEqual(round(stats["reduction_ratio"], 2), round(1 - len(pairs)/15, 2))
+		self.assertEqual(list(pytextdist.record_linkage.sorted_neighbourhood_pairs(records[:3], records_2=["Acme Inc", "Zeta"], window=3)), [(1, 0), (2, 0), (2, 1)])
+		links = list(pytextdist.record_linkage.link_records(records, pytextdist.edit_distance.levenshtein_similarity, 0.99, key_funcs=key_funcs))
+		self.assertEqual([(index_1, index_2) for index_1, index_2, _ in links], [(0, 1)] + ([(4, 5)] if self.kwargs["phrase_1"] == self.kwargs["phrase_2"] else []))
+
+	def test_similarity_join(self):
+		phrases = [self.kwargs["sentence_1"], self.kwargs["sentence_2"], "privacy act notice", "act notice privacy", "paperwork reduction", "form 1040"]
+		for metric in ("jaccard_similarity", "sorensen_dice_similarity", "cosine_similarity"):
+			func = getattr(pytextdist.vector_similarity, metric)
+			for threshold in (0.3, 0.6, 1.0):
+				expected = [(index_1, index_2, func(phrases[index_1], phrases[index_2])) for index_1 in range(len(phrases)) for index_2 in range(index_1+1, len(phrases)) if func(phrases[index_1], phrases[index_2]) >= threshold]
+				self.assertEqual(pytextdist.similarity_join.similarity_join(phrases, threshold=threshold, metric=metric), expected)
+				expected = [(index_1, index_2, func(phrases[index_1], phrases[index_2])) for index_1 in range(2) for index_2 in range(2, len(phrases)) if func(phrases[index_1], phrases[index_2]) >= threshold]
+				self.assertEqual(pytextdist.similarity_join.similarity_join(phrases[:2], phrases_2=phrases[2:], threshold=threshold, metric=metric), [(index_1, index_2-2, similarity) for index_1, index_2, similarity in expected])
+		self.assertEqual(pytextdist.similarity_join.similarity_join(["form", "a form", "privacy act"], threshold=0.5, n=2), [])
+		expected = pytextdist.similarity_join.similarity_join(phrases, threshold=0.3, n=2)
+		for ngram_key in ("tuple", "hash"):
+			self.assertEqual(pytextdist.similarity_join.similarity_join(phrases, threshold=0.3, n=2, ngram_key=ngram_key), expected)
+
+	def test_cache(self):
+		cache = pytextdist.cache.MemoryCache(max_size=2)
+		func = pytextdist.cache.cached(pytextdist.edit_distance.levenshtein_distance, cache)
+		self.assertEqual(func(self.kwargs["phrase_1"], self.kwargs["phrase_2"]), self.kwargs["lev_d"])
+		self.assertEqual(func(self.kwargs["phrase_1"].upper(), self.kwargs["phrase_2"]), self.kwargs["lev_d"])
+		self.assertEqual(cache.stats, {"hits": 1, "misses": 1})
+		pairs = [(self.kwargs["sentence_1"], self.kwargs["sentence_2"]), ("kitten", "sitting"), ("kitten", "sitting")]
+		with tempfile.TemporaryDirectory() as directory:
+			for _ in range(2):
+				with pytextdist.cache.SQLiteCache(os.path.join(directory, "cache.db")) as cache:
+					scores = pytextdist.cache.cached_batch(pytextdist.vector_similarity.jaccard_similarity, pairs, cache, n=2, grain="char")
+			self.assertEqual(scores, [pytextdist.vector_similarity.jaccard_similarity(phrase_1, phrase_2, n=2, grain="char") for phrase_1, phrase_2 in pairs])
+			self.assertEqual(cache.hit_rate(), 1.0)
+			path = os.path.join(directory, "expiring.db")
+			with pytextdist.cache.SQLiteCache(path, ttl=0.01) as cache: pytextdist.cache.cached_batch(pytextdist.edit_distance.levenshtein_distance, pairs, cache)
+			time.sleep(0.02)
+			with pytextdist.cache.SQLiteCache(path, ttl=0.01) as cache: self.assertEqual(cache.get_many(["missing"]), {})
+			with pytextdist.cache.SQLiteCache(path) as cache: self.assertEqual(len(cache), 0)
+		self.assertNotEqual(pytextdist.cache.cache_key(pytextdist.vector_similarity.jaccard_similarity, "a b", "b c"), pytextdist.cache.cache_key(pytextdist.vector_similarity.jaccard_similarity, "a b", "b c", n=2))
+		func, cache = pytextdist.edit_distance.weighted_levenshtein_distance, pytextdist.cache.MemoryCache()
+		for costs in ({("0", "o"): 0.1}, {("0", "o"): 0.2}):
+			self.assertEqual(pytextdist.cache.cached(func, cache)("g00d", "good", substitute_costs=costs, ignore_numeric=False), func("g00d", "good", substitute_costs=costs, ignore_numeric=False))
+		with self.assertRaises(TypeError): pytextdist.cache.cache_key(func, "g00d", "good", substitute_costs=object())
+		if importlib.util.find_spec("numpy") is not None:
+			import numpy as np
+			matrix = np.ones((42, 42))
+			changed = matrix.copy()
+			changed[20, 20] = 0.5
+			self.assertNotEqual(pytextdist.cache.cache_key(func, "a", "b", substitute_costs=matrix), pytextdist.cache.cache_key(func, "a", "b", substitute_costs=changed))
+
+	def test_dictionary_search(self):
+		vocabulary = ["kitten", "kitchen", "sitting", "mitten", "ktiten", self.kwargs["phrase_1"], self.kwargs["phrase_2"]]
+		matcher = pytextdist.dictionary_search.TrieMatcher(vocabulary)
+		for metric in ("levenshtein_distance", "damerau_levenshtein_distance"):
+			func = getattr(pytextdist.edit_distance, metric)
+			expected = sorted([(func("kitten", phrase), index, phrase) for index, phrase in enumerate(vocabulary) if func("kitten", phrase) <= 2])
+			self.assertEqual(matcher.search("kitten", max_distance=2, metric=metric), [(phrase, distance) for distance, _, phrase in expected])
+		self.assertEqual(matcher.search(self.kwargs["phrase_1"], max_distance=self.kwargs["lev_d"])[0], (self.kwargs["phrase_1"], 0))
+		expected = sorted([(-pytextdist.edit_distance.jaro_winkler_similarity("kiten", phrase), index, phrase) for index, phrase in enumerate(vocabulary)])[:3]
+		self.assertEqual(matcher.rank_jaro_winkler("kiten", top_k=3), [(phrase, -similarity) for similarity, _, phrase in expected])
+		vocabulary = ["".join(chr(ord("a") + (index * prime) % 26) for prime in (7, 11, 13, 17, 19)[:3 + index % 3]) + str(index) for index in range(300)] + ["kitten", "kitchen"]
+		matcher, stats = pytextdist.dictionary_search.TrieMatcher(vocabulary, ignore_numeric=False), {}
+		expected = sorted([(-pytextdist.edit_distance.jaro_winkler_similarity("kitten", phrase, ignore_numeric=False), index, phrase) for index, phrase in enumerate(vocabulary)])[:2]
+		self.assertEqual(matcher.rank_jaro_winkler("kitten", top_k=2, stats=stats), [(phrase, -similarity) for similarity, _, phrase in expected])
+		self.assertLess(stats["n_scored"], len(vocabulary) // 2)
+		# Above p = 0.2 a prefix of 5 makes the similarity fall as Jaro rises, so the longest phrases may rank first
+		vocabulary = ["abcde" + "".join(chr(ord("f") + (index * prime) % 21) for prime in (3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)[:index % 13]) for index in range(100)]
+		matcher = pytextdist.dictionary_search.TrieMatcher(vocabulary)
+		expected = sorted([(-pytextdist.edit_distance.jaro_winkler_similarity("abcdehigff", phrase, p=0.24), index, phrase) for index, phrase in enumerate(vocabulary)])[:3]
+		self.assertEqual(matcher.rank_jaro_winkler("abcdehigff", top_k=3, p=0.24), [(phrase, -similarity) for similarity, _, phrase in expected])
+
+	def test_sharding(self):
+		queries = ["kitten", "sitting", "mitten", self.kwargs["phrase_1"], "acme corp", "kitchen"]
+		choices = ["kitchen", "acme inc", "bitten", self.kwargs["phrase_2"], "sitter"]
+		func = pytextdist.edit_distance.levenshtein_distance
+		single = pytextdist.sharding.merge_partial_results([pytextdist.sharding.score_shard(queries, choices, func, 0, 1, top_k=2, threshold=2, largest=False)])
+		self.assertEqual(single["counters"], {"n_query": 6, "n_pair": 30, "n_hit": len(single["hits"])})
+		self.assertEqual(single["top_k"][0], [(2, 1), (0, 2)])
+		with tempfile.TemporaryDirectory() as directory:
+			for by in ("queries", "choices"):
+				paths = [os.path.join(directory, "{}_{}.jsonl".format(by, shard)) for shard in range(3)]
+				for shard, path in enumerate(paths): pytextdist.sharding.score_shard(queries, choices, func, shard, 3, by=by, top_k=2, threshold=2, largest=False, path=path, checkpoint_every=2)
+				self.assertEqual(pytextdist.sharding.merge_partial_results(paths), single)
+				self.assertRaises(Exception, pytextdist.sharding.merge_partial_results, paths[:2])
+
+			# A scorer failing partway through leaves a checkpoint that the rerun resumes from
+			calls = []
+			def flaky_distance(phrase_1, phrase_2):
+				calls.append((phrase_1, phrase_2))
+				if len(calls) == 12: raise RuntimeError("worker lost")
+				return func(phrase_1, phrase_2)
+			path = os.path.join(directory, "resumed.jsonl")
+			self.assertRaises(RuntimeError, pytextdist.sharding.score_shard, queries, choices, flaky_distance, 0, 1, top_k=2, threshold=2, largest=False, path=path, checkpoint_every=1)
+			# A checkpoint cut short by the crash is dropped
+			with open(path, "a") as f: f.write('{"position": 3, "top_k"')
+			resumed = pytextdist.sharding.score_shard(queries, choices, flaky_distance, 0, 1, top_k=2, threshold=2, largest=False, path=path, checkpoint_every=1)
+			self.assertEqual(len(calls), 12 + 30 - 10)
+			self.assertEqual(pytextdist.sharding.merge_partial_results([resumed]), single)
+			self.assertEqual(pytextdist.sharding.score_shard(queries, choices, flaky_distance, 0, 1, top_k=2, threshold=2, largest=False, path=path), resumed)
+			self.assertEqual(len(calls), 12 + 30 - 10)
+			self.assertRaises(Exception, pytextdist.sharding.score_shard, queries, choices, flaky_distance, 0, 1, top_k=3, threshold=2, largest=False, path=path)
+			self.assertRaises(Exception, pytextdist.sharding.score_shard, queries, choices[:4], flaky_distance, 0, 1, top_k=2, threshold=2, largest=False, path=path)
+			# Scorer parameters are part of the settings, compared by content
+			def costed_distance(phrase_1, phrase_2, costs):
+				return func(phrase_1, phrase_2) * costs[("a", "b")]
+			path = os.path.join(directory, "costed.jsonl")
+			pytextdist.sharding.score_shard(queries, choices, costed_distance, 0, 1, path=path, costs={("a", "b"): 1})
+			self.assertRaises(Exception, pytextdist.sharding.score_shard, queries, choices, costed_distance, 0, 1, path=path, costs={("a", "b"): 2})
+
+	def test_pdist(self):
+		phrases = [self.kwargs["phrase_1"], "kitten", self.kwargs["phrase_2"], "Kitten!", "sitting"]
+		for func in (pytextdist.edit_distance.levenshtein_similarity, pytextdist.vector_similarity.jaccard_similarity):
+			expected = [func(phrases[index_1], phrases[index_2]) for index_1 in range(len(phrases)) for index_2 in range(index_1+1, len(phrases))]
+			self.assertEqual(pytextdist.scoring.pdist(phrases, scorer=func), expected)
+		expected = [(index_1, index_2, distance) for index_1 in range(len(phrases)) for index_2 in range(index_1+1, len(phrases)) for distance in [pytextdist.edit_distance.levenshtein_distance(phrases[index_1], phrases[index_2])] if distance <= 3]
+		self.assertEqual(pytextdist.scoring.pdist(phrases, scorer=pytextdist.edit_distance.levenshtein_distance, threshold=3, largest=False), expected)
+
+	def test_lazy_import(self):
+		code = "import sys, pytextdist; assert not [m for m in sys.modules if m.startswith('pytextdist.')]; pytextdist.scoring; assert 'pytextdist.sharding' not in sys.modules and 'numpy' not in sys.modules"
+		subprocess.check_call([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)))
+		self.assertIs(pytextdist.edit_distance, sys.modules["pytextdist.edit_distance"])
+		self.assertRaises(AttributeError, getattr, pytextdist, "no_such_module")
 
 test_cases = [
 	{